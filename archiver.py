@@ -0,0 +1,76 @@
+"""
+Архивация обработанных напоминаний
+
+Отправленные и неотправленные напоминания старше срока хранения переносятся
+пачками из рабочей таблицы reminders в таблицу reminders_archive или в файл
+JSONL, чтобы рабочая таблица и ее индексы росли только вместе с очередью.
+"""
+
+import os
+import enum
+import json
+import logging
+from datetime import datetime, timedelta
+from config import Config
+
+class ArchiveStats:
+    """Итоги архивации"""
+
+    def __init__(self):
+        self.archived = 0
+        self.batches = 0
+        self.complete = False
+
+class Archiver:
+    """Перенос обработанных напоминаний в архив ограниченными пачками
+
+    export_path - файл JSONL, в который дописываются строки вместо таблицы
+    архива. Каждая пачка сначала записывается на диск, и только потом
+    удаляется из базы, поэтому сбой между шагами не теряет напоминаний.
+    """
+
+    def __init__(self, db_manager, retention_days=None, batch_size=None, export_path=None):
+        self.logger = logging.getLogger(__name__)
+        self.db_manager = db_manager
+        self.retention_days = retention_days if retention_days is not None else Config.ARCHIVE_RETENTION_DAYS
+        self.batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+        self.export_path = export_path
+
+    def run(self, now=None, should_stop=None):
+        """Архивация до исчерпания подходящих напоминаний
+
+        should_stop - функция, которая проверяется между пачками: если она
+        вернула True, архивация прерывается и продолжится при следующем запуске.
+        """
+        before = (now or datetime.utcnow()) - timedelta(days=self.retention_days)
+        stats = ArchiveStats()
+        export_file = open(self.export_path, 'a', encoding='utf-8') if self.export_path else None
+        try:
+            export = (lambda rows: self._export(export_file, rows)) if export_file else None
+            while True:
+                archived = self.db_manager.archive_reminder_batch(before, self.batch_size, export)
+                stats.archived += archived
+                stats.batches += 1 if archived else 0
+                if archived < self.batch_size:
+                    stats.complete = True
+                    break
+                if should_stop and should_stop():
+                    break
+        finally:
+            if export_file:
+                export_file.close()
+        
+        if stats.archived:
+            self.logger.info(f"В архив перенесено {stats.archived} напоминаний старше {before}")
+        return stats
+
+    def _export(self, export_file, rows):
+        """Запись пачки в файл JSONL с принудительным сбросом на диск"""
+        for row in rows:
+            record = {
+                key: value.value if isinstance(value, enum.Enum) else value
+                for key, value in row.items()
+            }
+            export_file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        export_file.flush()
+        os.fsync(export_file.fileno())
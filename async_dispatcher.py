@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from config import Config
+from database import NotificationMethod
+from channels import SendDeferred
+
+class AsyncDispatcher:
+    """Параллельная отправка напоминаний с ограничением числа отправок по каналам
+
+    Отправки пачки ждут очереди по лимитам одновременно, поэтому пачка ждет
+    не дольше max_wait секунд. Сообщение, место которого в очереди дальше,
+    не ждет: для его напоминаний вызывается on_defer(reminders, delay), а
+    результатом отправки становится None. Так же обрабатывается SendDeferred
+    канала.
+    """
+
+    def __init__(self, notification_service, limits=None, max_wait=None, on_defer=None):
+        self.logger = logging.getLogger(__name__)
+        self.notification_service = notification_service
+        self.max_wait = Config.RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+        self.on_defer = on_defer
+        self.limits = limits or {
+            NotificationMethod.EMAIL: Config.EMAIL_CONCURRENCY,
+            NotificationMethod.TELEGRAM: Config.TELEGRAM_CONCURRENCY,
+            NotificationMethod.CONSOLE: Config.CONSOLE_CONCURRENCY,
+            NotificationMethod.WEBHOOK: Config.WEBHOOK_CONCURRENCY,
+        }
+        self._semaphores = {}
+
+    def _get_semaphore(self, method):
+        """Семафор, ограничивающий число одновременных отправок через канал"""
+        if method not in self._semaphores:
+            self._semaphores[method] = asyncio.Semaphore(max(1, self.limits.get(method, 1)))
+        return self._semaphores[method]
+
+    async def _send(self, user, reminders):
+        """Отправка одного сообщения с учетом лимитов его канала"""
+        # Очередь по лимиту скорости ждем до захвата семафора, чтобы
+        # ожидающие сообщения одного чата не занимали слоты остальных
+        delay = self.notification_service.reserve_slot(user, reminders, self.max_wait)
+        if delay > self.max_wait:
+            return self._defer(reminders, delay)
+        if delay:
+            await asyncio.sleep(delay)
+        async with self._get_semaphore(reminders[0].notification_method):
+            try:
+                success = await self.notification_service.send_reminders_async(
+                    user, reminders, rate_limit=False
+                )
+            except SendDeferred as e:
+                return self._defer(reminders, e.delay)
+            except Exception as e:
+                ids = ', '.join(str(reminder.id) for reminder in reminders)
+                self.logger.error(f"Ошибка асинхронной отправки напоминаний {ids}: {e}")
+                success = False
+        return reminders, success
+
+    def _defer(self, reminders, delay):
+        if self.on_defer:
+            self.on_defer(reminders, delay)
+        return reminders, None
+
+    async def dispatch(self, batch):
+        """Одновременная отправка пачки напоминаний
+
+        batch - список пар (reminder, user). Возвращает список пар
+        (reminder, success) в том же порядке, success = None для отложенных.
+        """
+        results = await self.dispatch_digests([(user, [reminder]) for reminder, user in batch])
+        return [(reminders[0], success) for reminders, success in results]
+
+    async def dispatch_digests(self, digests):
+        """Одновременная отправка дайджестов
+
+        digests - список пар (user, reminders). Возвращает список пар
+        (reminders, success) в том же порядке, success = None для отложенных.
+        """
+        return await asyncio.gather(*(self._send(user, reminders) for user, reminders in digests))
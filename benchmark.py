@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест и бенчмарк доставки напоминаний
+
+Заполняет базу (по умолчанию временную SQLite) пользователями и напоминаниями,
+поднимает локальные заглушки SMTP и Telegram с настраиваемой задержкой и
+прогоняет ReminderBot.check_and_send_reminders или цикл run. Результаты
+(напоминаний в секунду, задержка p50/p99 от reminder_time до отправки,
+число SQL запросов, пиковая память) печатаются и сохраняются в JSON файл,
+чтобы сравнивать версии между собой.
+
+Сценарий fetch сравнивает способы выборки напоминаний из базы.
+"""
+
+import os
+import json
+import math
+import time
+import logging
+import argparse
+import sys
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+import tracemalloc
+from datetime import datetime, timedelta
+from sqlalchemy import event, select
+from config import Config
+from database import DatabaseManager, NotificationMethod, ReminderStatus, User, Reminder
+from fake_channels import FakeSMTPServer, FakeTelegramServer, FakeWebhookServer
+
+CHANNELS = {
+    'email': NotificationMethod.EMAIL,
+    'telegram': NotificationMethod.TELEGRAM,
+    'console': NotificationMethod.CONSOLE,
+    'webhook': NotificationMethod.WEBHOOK,
+}
+
+class QueryCounter:
+    """Счетчик SQL запросов, выполненных через engine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def reset(self):
+        self.count = 0
+
+    def close(self):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+def seed_database(db_manager, users_count, reminders_count, methods=(NotificationMethod.CONSOLE,),
+                  due_time=None, spread=0.0):
+    """Заполнение базы пользователями и напоминаниями
+
+    Напоминания равномерно распределяются по каналам methods и по сроку
+    в интервале [due_time, due_time + spread секунд].
+    """
+    due_time = due_time or datetime.utcnow() - timedelta(minutes=1)
+    session = db_manager.get_session()
+    try:
+        session.bulk_insert_mappings(User, [
+            {
+                'id': i + 1,
+                'name': f"Пользователь {i + 1}",
+                'email': f"user{i + 1}@example.com",
+                'telegram_id': str(100000 + i),
+            }
+            for i in range(users_count)
+        ])
+        session.bulk_insert_mappings(Reminder, [
+            {
+                'user_id': i % users_count + 1,
+                'title': f"Напоминание {i + 1}",
+                'message': "Тестовое сообщение",
+                'reminder_time': due_time + timedelta(seconds=spread * i / reminders_count),
+                'notification_method': methods[i % len(methods)],
+                'status': ReminderStatus.PENDING,
+            }
+            for i in range(reminders_count)
+        ])
+        session.commit()
+    finally:
+        session.close()
+
+def seed_backlog(db_manager, users_count, backlog_count, methods, age):
+    """Просроченные напоминания, накопившиеся за простой длиной age секунд"""
+    started = datetime.utcnow() - timedelta(seconds=age)
+    session = db_manager.get_session()
+    try:
+        session.bulk_insert_mappings(Reminder, [
+            {
+                'user_id': i % users_count + 1,
+                'title': f"Пропущенное напоминание {i + 1}",
+                'message': "Тестовое сообщение",
+                'reminder_time': started + timedelta(seconds=age * i / backlog_count),
+                'notification_method': methods[i % len(methods)],
+                'status': ReminderStatus.PENDING,
+            }
+            for i in range(backlog_count)
+        ])
+        session.commit()
+    finally:
+        session.close()
+
+def percentile(values, fraction):
+    """Перцентиль по методу ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+def git_revision():
+    """Текущий коммит репозитория, если доступен"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+# Сценарий fetch: способы выборки напоминаний
+
+def legacy_fetch(db_manager):
+    """Выборка напоминаний и пользователей по-старому: запрос на каждого пользователя"""
+    return [
+        (reminder, db_manager.get_user_by_id(reminder.user_id))
+        for reminder in db_manager.get_pending_reminders()
+    ]
+
+def legacy_fetch_unit_of_work(db_manager):
+    """Выборка по-старому через одно соединение на весь проход"""
+    with db_manager.unit_of_work():
+        return legacy_fetch(db_manager)
+
+def streamed_fetch(db_manager):
+    """Потоковая выборка напоминаний пачками без накопления в памяти"""
+    count = 0
+    for batch in db_manager.iter_due_reminders():
+        count += len(batch)
+    return count
+
+def measure(counter, func):
+    """Замер количества запросов и времени выполнения функции"""
+    counter.reset()
+    started = time.perf_counter()
+    func()
+    return {'queries': counter.count, 'seconds': time.perf_counter() - started}
+
+def run_fetch_scenario(database_url, users_count, reminders_count):
+    """Сравнение выборки по-старому (с общим соединением и без), одним запросом и потоково"""
+    db_manager = DatabaseManager(database_url)
+    db_manager.create_tables()
+    seed_database(db_manager, users_count, reminders_count)
+
+    counter = QueryCounter(db_manager.engine)
+    try:
+        return {
+            'legacy_fetch': measure(counter, lambda: legacy_fetch(db_manager)),
+            'legacy_fetch_unit_of_work': measure(counter, lambda: legacy_fetch_unit_of_work(db_manager)),
+            'batched_fetch': measure(counter, db_manager.get_due_reminders_with_users),
+            'streamed_fetch': measure(counter, lambda: streamed_fetch(db_manager)),
+        }
+    finally:
+        counter.close()
+        db_manager.engine.dispose()
+
+# Сценарий dispatch: доставка через заглушки каналов
+
+def configure_channels(smtp_server, telegram_server, webhook_server):
+    """Направление каналов бота на локальные заглушки"""
+    Config.SMTP_SERVER = '127.0.0.1'
+    Config.SMTP_PORT = smtp_server.port
+    Config.SMTP_STARTTLS = False
+    Config.EMAIL_USER = 'bench@localhost'
+    Config.EMAIL_PASSWORD = ''
+    Config.TELEGRAM_BOT_TOKEN = '0:benchmark'
+    Config.TELEGRAM_BASE_URL = telegram_server.base_url
+    Config.WEBHOOK_URL = webhook_server.url
+
+def count_pending(db_manager):
+    """Количество еще не отправленных напоминаний"""
+    session = db_manager.get_session()
+    try:
+        return session.query(Reminder).filter(Reminder.status == ReminderStatus.PENDING).count()
+    finally:
+        session.close()
+
+def collect_lags(db_manager, since=None):
+    """Задержки от reminder_time до отправки по отправленным напоминаниям, секунд
+
+    since - учитывать только напоминания со сроком не раньше since.
+    """
+    session = db_manager.get_session()
+    try:
+        query = select(Reminder.reminder_time, Reminder.sent_at).where(Reminder.status == ReminderStatus.SENT)
+        if since is not None:
+            query = query.where(Reminder.reminder_time >= since)
+        rows = session.execute(query).all()
+        return [(row.sent_at - row.reminder_time).total_seconds() for row in rows]
+    finally:
+        session.close()
+
+def run_dispatch_scenario(database_url, users_count, reminders_count, methods, mode,
+                          smtp_latency, telegram_latency, spread, timeout, telegram_throttle_every=0,
+                          webhook_latency=0.0, webhook_throttle_every=0, backlog=0, backlog_age=3600.0):
+    """Доставка напоминаний через заглушки SMTP, Telegram и webhook с замерами
+
+    backlog - число просроченных напоминаний, накопившихся за простой длиной
+    backlog_age секунд; задержка текущих напоминаний считается отдельно.
+    """
+    from main import ReminderBot
+
+    smtp_server = FakeSMTPServer(latency=smtp_latency).start()
+    telegram_server = FakeTelegramServer(latency=telegram_latency,
+                                         throttle_every=telegram_throttle_every).start()
+    webhook_server = FakeWebhookServer(latency=webhook_latency, throttle_every=webhook_throttle_every).start()
+    configure_channels(smtp_server, telegram_server, webhook_server)
+    Config.DATABASE_URL = database_url
+
+    bot = ReminderBot()
+    bot.initialize_database()
+    # В режиме run сроки напоминаний в будущем, чтобы мерить работу планировщика
+    lead = timedelta(seconds=1) if mode == 'run' else timedelta(0)
+    current_since = datetime.utcnow() + lead
+    seed_database(bot.db_manager, users_count, reminders_count, methods,
+                  due_time=current_since, spread=spread)
+    if backlog:
+        seed_backlog(bot.db_manager, users_count, backlog, methods, backlog_age)
+    observer = DatabaseManager(database_url)
+
+    counter = QueryCounter(bot.db_manager.engine)
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        if mode == 'tick':
+            bot.check_and_send_reminders()
+        else:
+            runner = threading.Thread(target=bot.run, daemon=True)
+            runner.start()
+            deadline = started + timeout
+            while count_pending(observer) and time.perf_counter() < deadline:
+                time.sleep(0.05)
+            bot.stop()
+            runner.join(timeout=10)
+        elapsed = time.perf_counter() - started
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        counter.close()
+        bot.notification_service.close()
+        smtp_server.stop()
+        telegram_server.stop()
+        webhook_server.stop()
+
+    lags = collect_lags(observer)
+    current_lags = collect_lags(observer, since=current_since) if backlog else lags
+    pending = count_pending(observer)
+    observer.engine.dispose()
+    bot.db_manager.engine.dispose()
+
+    return {
+        'delivered': len(lags),
+        'pending': pending,
+        'seconds': elapsed,
+        'reminders_per_second': len(lags) / elapsed if elapsed else None,
+        'lag_p50_seconds': percentile(lags, 0.50),
+        'lag_p99_seconds': percentile(lags, 0.99),
+        'current_lag_p50_seconds': percentile(current_lags, 0.50),
+        'current_lag_p99_seconds': percentile(current_lags, 0.99),
+        'db_queries': counter.count,
+        'peak_traced_memory_bytes': peak_memory,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'smtp_connections': smtp_server.connections,
+        'smtp_messages': smtp_server.messages,
+        'telegram_messages': telegram_server.messages,
+        'telegram_throttled': telegram_server.throttled,
+        'webhook_requests': webhook_server.requests,
+        'webhook_messages': webhook_server.messages,
+        'webhook_max_batch': webhook_server.max_batch,
+        'webhook_throttled': webhook_server.throttled,
+    }
+
+# Сценарий ingest: создание напоминаний параллельными клиентами
+
+def run_ingest_scenario(database_url, clients, reminders_count, request_batch):
+    """Создание напоминаний clients потоками: add_reminder и HTTP прием с групповой фиксацией"""
+    import http.client
+    from ingest_server import IngestServer
+    
+    db_manager = DatabaseManager(database_url)
+    db_manager.create_tables()
+    seed_database(db_manager, clients, 0)
+    reminder_time = datetime.utcnow() + timedelta(days=1)
+    per_client = reminders_count // clients
+    
+    def run_clients(worker):
+        threads = [threading.Thread(target=worker, args=(client + 1,)) for client in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+    
+    # Каждое напоминание - отдельная транзакция
+    def add_directly(user_id):
+        for i in range(per_client):
+            db_manager.add_reminder(user_id, f"Напоминание {i}", '', reminder_time)
+    
+    direct_seconds = run_clients(add_directly)
+    
+    server = IngestServer('127.0.0.1', 0, db_manager).start()
+    host, port = server.server_address[:2]
+    
+    def post_to_server(user_id):
+        connection = http.client.HTTPConnection(host, port)
+        record = {'user_id': user_id, 'title': 'Напоминание', 'reminder_time': reminder_time.isoformat()}
+        body = json.dumps([record] * request_batch if request_batch > 1 else record)
+        for _ in range(per_client // request_batch):
+            connection.request('POST', '/reminders', body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            if response.status != 201:
+                raise RuntimeError(f"Ответ сервера приема: {response.status}")
+        connection.close()
+    
+    try:
+        ingest_seconds = run_clients(post_to_server)
+    finally:
+        server.stop()
+        db_manager.engine.dispose()
+    
+    total = per_client * clients
+    return {
+        'reminders': total,
+        'add_reminder_per_second': total / direct_seconds,
+        'ingest_per_second': (per_client // request_batch) * request_batch * clients / ingest_seconds,
+    }
+
+# Сценарий startup: время запуска CLI
+
+STARTUP_COMMANDS = {
+    'add-user': ['add-user', 'Пользователь'],
+    'add-reminder': ['add-reminder', '1', 'Напоминание', '2030-01-01 10:00'],
+    'help': ['--help'],
+}
+
+def run_startup_scenario(database_url, runs):
+    """Время выполнения команд bot_cli отдельным процессом (медиана и минимум по runs запускам)"""
+    cli = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bot_cli.py')
+    env = dict(os.environ, DATABASE_URL=database_url, LOG_LEVEL='WARNING')
+    with tempfile.TemporaryDirectory() as work_dir:
+        def run(arguments):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, cli] + arguments, cwd=work_dir, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            return time.perf_counter() - started
+        
+        # Схема создается до замеров
+        run(['init-db'])
+        results = {}
+        for name, arguments in STARTUP_COMMANDS.items():
+            timings = [run(arguments) for _ in range(runs)]
+            results[name] = {'median_seconds': percentile(timings, 0.5), 'min_seconds': min(timings)}
+        return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест доставки напоминаний')
+    parser.add_argument('--scenario', choices=['fetch', 'dispatch', 'startup', 'ingest', 'all'], default='all',
+                        help='Что измерять')
+    parser.add_argument('--users', type=int, default=1000, help='Количество пользователей')
+    parser.add_argument('--reminders', type=int, default=10000, help='Количество напоминаний')
+    parser.add_argument('--database-url', help='База данных (по умолчанию временная SQLite)')
+    parser.add_argument('--mode', choices=['tick', 'run'], default='tick',
+                        help='tick - один вызов check_and_send_reminders, run - цикл бота')
+    parser.add_argument('--dispatch-mode', choices=['sync', 'async'], default=Config.DISPATCH_MODE,
+                        help='Режим отправки')
+    parser.add_argument('--channels', default='email,telegram',
+                        help='Каналы через запятую: email, telegram, console, webhook')
+    parser.add_argument('--smtp-latency', type=float, default=0.0, help='Задержка заглушки SMTP, секунд')
+    parser.add_argument('--telegram-latency', type=float, default=0.0,
+                        help='Задержка заглушки Telegram, секунд')
+    parser.add_argument('--telegram-throttle-every', type=int, default=0,
+                        help='Заглушка Telegram отвечает 429 на каждый N-й запрос')
+    parser.add_argument('--webhook-latency', type=float, default=0.0,
+                        help='Задержка заглушки webhook, секунд')
+    parser.add_argument('--webhook-throttle-every', type=int, default=0,
+                        help='Заглушка webhook отвечает 429 на каждый N-й запрос')
+    parser.add_argument('--spread', type=float, default=0.0,
+                        help='Разброс сроков напоминаний, секунд')
+    parser.add_argument('--backlog', type=int, default=0,
+                        help='Дополнительно просроченных напоминаний (очередь после простоя)')
+    parser.add_argument('--backlog-age', type=float, default=3600.0,
+                        help='Длительность простоя, за который накопился бэклог, секунд')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Предел ожидания в режиме run, секунд')
+    parser.add_argument('--ingest-clients', type=int, default=16, help='Параллельных клиентов в сценарии ingest')
+    parser.add_argument('--ingest-batch', type=int, default=1, help='Напоминаний в одном запросе сценария ingest')
+    parser.add_argument('--startup-runs', type=int, default=10, help='Запусков CLI в сценарии startup')
+    parser.add_argument('--output', default='benchmark_results.json', help='Файл для результатов JSON')
+    args = parser.parse_args()
+
+    try:
+        methods = tuple(CHANNELS[name.strip()] for name in args.channels.split(',') if name.strip())
+    except KeyError as e:
+        parser.error(f"Неизвестный канал: {e}")
+    Config.DISPATCH_MODE = args.dispatch_mode
+
+    # Логи бота не должны влиять на замеры
+    logging.basicConfig(level=logging.WARNING)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        def database_url(name):
+            return args.database_url or f"sqlite:///{os.path.join(tmp_dir, name)}"
+
+        if args.scenario in ('fetch', 'all'):
+            results['fetch'] = run_fetch_scenario(database_url('fetch.db'), args.users, args.reminders)
+        if args.scenario in ('dispatch', 'all'):
+            results['dispatch'] = run_dispatch_scenario(
+                database_url('dispatch.db'), args.users, args.reminders, methods, args.mode,
+                args.smtp_latency, args.telegram_latency, args.spread, args.timeout,
+                args.telegram_throttle_every, args.webhook_latency, args.webhook_throttle_every,
+                args.backlog, args.backlog_age
+            )
+        if args.scenario in ('ingest', 'all'):
+            results['ingest'] = run_ingest_scenario(
+                database_url('ingest.db'), args.ingest_clients, args.reminders, args.ingest_batch
+            )
+        if args.scenario in ('startup', 'all'):
+            results['startup'] = run_startup_scenario(database_url('startup.db'), args.startup_runs)
+
+    report = {
+        'timestamp': datetime.utcnow().isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'parameters': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as output:
+        json.dump(report, output, ensure_ascii=False, indent=2)
+
+    print(f"Пользователей: {args.users}, напоминаний: {args.reminders}, режим: {args.dispatch_mode}")
+    for name, result in results.get('fetch', {}).items():
+        print(f"{name:26} запросов: {result['queries']:7d}  время: {result['seconds']:8.3f} с")
+    for name, result in results.get('startup', {}).items():
+        print(f"bot_cli {name:13} медиана: {result['median_seconds']:.3f} с  минимум: {result['min_seconds']:.3f} с")
+    if 'ingest' in results:
+        ingest = results['ingest']
+        print(f"ingest: add_reminder {ingest['add_reminder_per_second']:.0f} напоминаний/с, "
+              f"прием с групповой фиксацией {ingest['ingest_per_second']:.0f} напоминаний/с")
+    if 'dispatch' in results:
+        dispatch = results['dispatch']
+        print(f"dispatch ({args.mode}): доставлено {dispatch['delivered']}, осталось {dispatch['pending']}")
+        if dispatch['delivered']:
+            print(f"  {dispatch['reminders_per_second']:.1f} напоминаний/с, "
+                  f"лаг p50 {dispatch['lag_p50_seconds']:.3f} с, p99 {dispatch['lag_p99_seconds']:.3f} с")
+        if args.backlog and dispatch['current_lag_p50_seconds'] is not None:
+            print(f"  текущие: лаг p50 {dispatch['current_lag_p50_seconds']:.3f} с, "
+                  f"p99 {dispatch['current_lag_p99_seconds']:.3f} с")
+        print(f"  запросов к базе: {dispatch['db_queries']}, "
+              f"пик памяти: {dispatch['peak_traced_memory_bytes'] // 1024} КБ")
+    print(f"Результаты сохранены в {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 """
 CLI для управления ботом напоминаний
+
+Модули бота импортируются по мере необходимости: административные команды
+загружают только слой базы данных, а каналы отправки - только run и demo.
+Схема базы создается командой init-db (и при запуске бота).
 """
 
+import sys
+import json
 import argparse
-from datetime import datetime, timedelta
-from main import ReminderBot
-from database import NotificationMethod
+from datetime import datetime
+from config import Config
 
 def parse_datetime(date_str):
     """Парсинг строки даты в datetime объект"""
@@ -24,15 +29,216 @@ def parse_datetime(date_str):
     
     raise ValueError(f"Неверный формат даты: {date_str}")
 
+def positive_int(value):
+    """Целое число не меньше 1 для аргументов командной строки"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается целое число: {value}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"ожидается число не меньше 1: {value}")
+    return number
+
+def open_database():
+    """Менеджер базы данных без создания схемы"""
+    from database import DatabaseManager
+    return DatabaseManager()
+
+def report_database_error(action, error):
+    """Сообщение об ошибке базы с подсказкой про init-db"""
+    # Для ошибок SQLAlchemy достаточно исходного сообщения драйвера
+    error = getattr(error, 'orig', None) or error
+    print(f"Ошибка {action}: {error}")
+    if 'no such table' in str(error) or 'does not exist' in str(error):
+        print("Схема базы не создана, выполните: python bot_cli.py init-db")
+
+def run_worker():
+    """Запуск одного воркера в отдельном процессе"""
+    from main import ReminderBot
+    Config.MULTI_WORKER = True
+    ReminderBot().run()
+
+def run_workers(count):
+    """Запуск нескольких воркеров, разбирающих напоминания через аренду"""
+    import multiprocessing
+    Config.MULTI_WORKER = True
+    workers = [multiprocessing.Process(target=run_worker, name=f"worker-{i + 1}") for i in range(count)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.join()
+
+def import_file(db_manager, args):
+    """Потоковый импорт пользователей или напоминаний из файла"""
+    from importer import Importer, detect_format, iter_records
+    
+    file_format = detect_format(args.file, args.format)
+    rejects_file = open(args.rejects, 'w', encoding='utf-8') if args.rejects else None
+    shown_rejects = [0]
+    
+    def on_reject(line_number, record, reason):
+        if rejects_file:
+            rejects_file.write(json.dumps(
+                {'line': line_number, 'reason': reason, 'record': record},
+                ensure_ascii=False, default=str
+            ) + '\n')
+        if shown_rejects[0] < 10:
+            print(f"Строка {line_number} отклонена: {reason}", file=sys.stderr)
+        shown_rejects[0] += 1
+    
+    importer = Importer(db_manager, chunk_size=args.chunk_size, on_reject=on_reject)
+    try:
+        with open(args.file, newline='', encoding='utf-8') as stream:
+            records = iter_records(stream, file_format)
+            if args.kind == 'users':
+                stats = importer.import_users(records)
+            else:
+                stats = importer.import_reminders(records)
+    finally:
+        if rejects_file:
+            rejects_file.close()
+    
+    print(f"Прочитано: {stats.read}, импортировано: {stats.imported}, отклонено: {stats.rejected}")
+    if stats.rejected and args.rejects:
+        print(f"Отклоненные строки записаны в {args.rejects}")
+
+def parse_cursor(cursor):
+    """Разбор ключа страницы вида '2024-01-15T14:30:00,42' в (reminder_time, id)"""
+    try:
+        time_part, id_part = cursor.rsplit(',', 1)
+        return datetime.fromisoformat(time_part), int(id_part)
+    except ValueError:
+        raise ValueError(f"Неверный ключ страницы: {cursor}")
+
+def list_reminders(db_manager, args):
+    """Постраничный вывод напоминаний пользователя или только их количества"""
+    from database import ReminderStatus
+    
+    try:
+        filters = {
+            'status': ReminderStatus(args.status) if args.status else None,
+            'since': parse_datetime(args.since) if args.since else None,
+            'until': parse_datetime(args.until) if args.until else None,
+        }
+        after = parse_cursor(args.after) if args.after else None
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        return
+    
+    try:
+        if args.count:
+            print(f"Напоминаний: {db_manager.count_user_reminders(args.user_id, **filters)}")
+            return
+        reminders = db_manager.list_user_reminders(args.user_id, limit=args.limit, after=after, **filters)
+    except Exception as e:
+        report_database_error("получения напоминаний", e)
+        return
+    
+    if not reminders:
+        print("Напоминаний не найдено")
+        return
+    
+    for reminder in reminders:
+        method = reminder.notification_method.value if reminder.notification_method else '-'
+        print(f"{reminder.id:>8}  {reminder.reminder_time:%Y-%m-%d %H:%M}  {reminder.status.value:<8} "
+              f"{method:<8} {reminder.title}")
+    if len(reminders) == args.limit:
+        last = reminders[-1]
+        print(f"Следующая страница: --after {last.reminder_time.isoformat()},{last.id}")
+
+def show_reminder(db_manager, args):
+    """Подробности напоминания и последние доставки повторяющегося напоминания"""
+    try:
+        reminder, deliveries = db_manager.get_reminder(args.reminder_id)
+    except Exception as e:
+        report_database_error("получения напоминания", e)
+        return
+    
+    if reminder is None:
+        print(f"Напоминание с ID {args.reminder_id} не найдено")
+        return
+    
+    archived_at = getattr(reminder, 'archived_at', None)
+    print(f"ID: {args.reminder_id}" + (f" (в архиве с {archived_at:%Y-%m-%d %H:%M})" if archived_at else ""))
+    print(f"Пользователь: {reminder.user_id}")
+    print(f"Заголовок: {reminder.title}")
+    if reminder.message:
+        print(f"Сообщение: {reminder.message}")
+    print(f"Время: {reminder.reminder_time}")
+    print(f"Метод: {reminder.notification_method.value if reminder.notification_method else '-'}")
+    print(f"Статус: {reminder.status.value}")
+    if reminder.sent_at:
+        print(f"Отправлено: {reminder.sent_at}")
+    if getattr(reminder, 'is_recurring', False):
+        print(f"Повторение: {reminder.recurring_interval} (каждые {reminder.recurrence_step or 1})")
+    if getattr(reminder, 'attempts', 0):
+        print(f"Неудачных попыток: {reminder.attempts}, следующая: {reminder.next_attempt_at}")
+    for delivery in deliveries:
+        print(f"  {delivery.scheduled_for:%Y-%m-%d %H:%M}  {delivery.status.value:<8} {delivery.delivered_at or ''}")
+
+def serve_ingest(db_manager, args):
+    """HTTP прием напоминаний до Ctrl+C; бот подхватит их при сверке с базой"""
+    import time
+    from ingest_server import IngestServer
+    
+    server = IngestServer(args.host, args.port, db_manager).start()
+    print(f"Прием напоминаний на {server.url}, остановка - Ctrl+C")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+def profile_ticks(args):
+    """Выполнение тиков отправки под cProfile и tracemalloc с выводом отчета"""
+    from main import ReminderBot
+    from profiler import TickProfiler
+    
+    bot = ReminderBot()
+    profiler = TickProfiler(bot, memory=not args.no_memory)
+    processed = 0
+    try:
+        for _ in range(args.ticks):
+            processed += profiler.run()
+    finally:
+        bot.notification_service.close()
+    
+    print(f"Обработано напоминаний: {processed}")
+    print(profiler.format_report(args.top))
+    if args.output:
+        profiler.dump(args.output)
+        print(f"Профиль сохранен в {args.output}")
+
+def archive(db_manager, args):
+    """Перенос обработанных напоминаний старше срока хранения в архив"""
+    from archiver import Archiver
+    
+    archiver = Archiver(db_manager, retention_days=args.days, batch_size=args.batch_size,
+                        export_path=args.export)
+    stats = archiver.run()
+    target = args.export or 'таблицу reminders_archive'
+    print(f"Перенесено в {target}: {stats.archived} напоминаний, пачек: {stats.batches}")
+
 def main():
     parser = argparse.ArgumentParser(description='Управление ботом напоминаний')
     subparsers = parser.add_subparsers(dest='command', help='Доступные команды')
     
+    # Команда создания схемы базы данных
+    subparsers.add_parser('init-db', help='Создать или обновить схему базы данных')
+    
     # Команда добавления пользователя
     add_user_parser = subparsers.add_parser('add-user', help='Добавить пользователя')
     add_user_parser.add_argument('name', help='Имя пользователя')
     add_user_parser.add_argument('--email', help='Email пользователя')
     add_user_parser.add_argument('--telegram-id', help='Telegram ID пользователя')
+    add_user_parser.add_argument('--webhook-url', help='Адрес webhook пользователя')
+    add_user_parser.add_argument('--locale', help='Язык сообщений пользователя (ru, en)')
     
     # Команда добавления напоминания
     add_reminder_parser = subparsers.add_parser('add-reminder', help='Добавить напоминание')
@@ -40,13 +246,61 @@ def main():
     add_reminder_parser.add_argument('title', help='Заголовок напоминания')
     add_reminder_parser.add_argument('datetime', help='Дата и время (YYYY-MM-DD HH:MM)')
     add_reminder_parser.add_argument('--message', help='Текст напоминания')
-    add_reminder_parser.add_argument('--method', choices=['console', 'email', 'telegram'], 
+    add_reminder_parser.add_argument('--method', choices=['console', 'email', 'telegram', 'webhook'], 
                                    default='console', help='Способ уведомления')
     add_reminder_parser.add_argument('--recurring', choices=['daily', 'weekly', 'monthly'],
                                    help='Интервал повторения')
+    add_reminder_parser.add_argument('--every', type=positive_int, default=1,
+                                   help='Повторять каждые N интервалов (например, --recurring weekly --every 2)')
+    
+    # Команды просмотра напоминаний
+    list_parser = subparsers.add_parser('list', help='Показать напоминания пользователя')
+    list_parser.add_argument('user_id', type=int, help='ID пользователя')
+    list_parser.add_argument('--status', choices=['pending', 'sent', 'failed', 'expired'], help='Только с этим статусом')
+    list_parser.add_argument('--since', help='Срок позже (YYYY-MM-DD HH:MM)')
+    list_parser.add_argument('--until', help='Срок не позже (YYYY-MM-DD HH:MM)')
+    list_parser.add_argument('--limit', type=int, default=20, help='Напоминаний на странице')
+    list_parser.add_argument('--after', help='Ключ страницы из вывода предыдущей страницы')
+    list_parser.add_argument('--count', action='store_true', help='Вывести только количество')
+    
+    show_parser = subparsers.add_parser('show', help='Показать напоминание')
+    show_parser.add_argument('reminder_id', type=int, help='ID напоминания')
+    
+    # Команда массового импорта
+    import_parser = subparsers.add_parser('import', help='Импортировать пользователей или напоминания из CSV/JSONL')
+    import_parser.add_argument('kind', choices=['users', 'reminders'], help='Что импортировать')
+    import_parser.add_argument('file', help='Путь к файлу CSV или JSONL')
+    import_parser.add_argument('--format', choices=['csv', 'jsonl'], help='Формат файла (по умолчанию по расширению)')
+    import_parser.add_argument('--chunk-size', type=int, default=1000, help='Строк в одной транзакции')
+    import_parser.add_argument('--rejects', help='Файл JSONL для отклоненных строк')
+    
+    # Команда архивации
+    archive_parser = subparsers.add_parser('archive', help='Перенести обработанные напоминания в архив')
+    archive_parser.add_argument('--days', type=int, default=Config.ARCHIVE_RETENTION_DAYS,
+                                help='Срок хранения в рабочей таблице, дней')
+    archive_parser.add_argument('--batch-size', type=int, default=Config.ARCHIVE_BATCH_SIZE,
+                                help='Строк в одной транзакции')
+    archive_parser.add_argument('--export', help='Дописать строки в файл JSONL вместо таблицы архива')
+    
+    # Команда приема напоминаний по HTTP без запуска отправки
+    ingest_parser = subparsers.add_parser('ingest', help='Принимать напоминания по HTTP (POST /reminders)')
+    ingest_parser.add_argument('--host', default=Config.INGEST_HOST, help='Адрес сервера')
+    ingest_parser.add_argument('--port', type=int, default=Config.INGEST_PORT or 8081, help='Порт сервера')
+    
+    # Команда профилирования тиков отправки
+    profile_parser = subparsers.add_parser(
+        'profile', help='Выполнить тики отправки под профилировщиком (напоминания действительно отправляются)'
+    )
+    profile_parser.add_argument('--ticks', type=int, default=1, help='Количество тиков')
+    profile_parser.add_argument('--top', type=int, default=15, help='Строк в списках функций и выделений памяти')
+    profile_parser.add_argument('--output', help='Сохранить профиль cProfile в файл (для pstats или snakeviz)')
+    profile_parser.add_argument('--no-memory', action='store_true',
+                                help='Без tracemalloc: точнее время, но без данных о памяти')
     
     # Команда запуска бота
     run_parser = subparsers.add_parser('run', help='Запустить бота')
+    run_parser.add_argument('--workers', type=int, default=1,
+                            help='Количество процессов-воркеров (больше 1 включает захват в аренду)')
     
     # Команда демонстрации
     demo_parser = subparsers.add_parser('demo', help='Запустить демонстрацию')
@@ -57,56 +311,88 @@ def main():
         parser.print_help()
         return
     
-    bot = ReminderBot()
-    bot.initialize_database()
+    if args.command == 'init-db':
+        try:
+            open_database().create_tables()
+            print("База данных инициализирована")
+        except Exception as e:
+            print(f"Ошибка инициализации базы данных: {e}")
     
-    if args.command == 'add-user':
-        user_id = bot.add_user(args.name, args.email, args.telegram_id)
-        if user_id:
+    elif args.command == 'add-user':
+        try:
+            user_id = open_database().add_user(args.name, args.email, args.telegram_id, args.webhook_url, args.locale)
             print(f"Пользователь '{args.name}' добавлен с ID: {user_id}")
-        else:
-            print("Ошибка добавления пользователя")
+        except Exception as e:
+            report_database_error("добавления пользователя", e)
     
     elif args.command == 'add-reminder':
         try:
             reminder_time = parse_datetime(args.datetime)
-            
-            # Преобразование метода уведомления
-            method_map = {
-                'console': NotificationMethod.CONSOLE,
-                'email': NotificationMethod.EMAIL,
-                'telegram': NotificationMethod.TELEGRAM
-            }
-            notification_method = method_map[args.method]
-            
-            is_recurring = args.recurring is not None
-            
-            reminder_id = bot.add_reminder(
+        except ValueError as e:
+            print(f"Ошибка: {e}")
+            print("Используйте формат: YYYY-MM-DD HH:MM")
+            return
+        
+        from database import NotificationMethod
+        
+        # Преобразование метода уведомления
+        method_map = {
+            'console': NotificationMethod.CONSOLE,
+            'email': NotificationMethod.EMAIL,
+            'telegram': NotificationMethod.TELEGRAM,
+            'webhook': NotificationMethod.WEBHOOK
+        }
+        notification_method = method_map[args.method]
+        
+        is_recurring = args.recurring is not None
+        
+        try:
+            reminder_id = open_database().add_reminder(
                 user_id=args.user_id,
                 title=args.title,
                 message=args.message or '',
                 reminder_time=reminder_time,
                 notification_method=notification_method,
                 is_recurring=is_recurring,
-                recurring_interval=args.recurring
+                recurring_interval=args.recurring,
+                recurrence_step=args.every
             )
-            
-            if reminder_id:
-                print(f"Напоминание '{args.title}' добавлено с ID: {reminder_id}")
-                print(f"Время: {reminder_time}")
-                print(f"Метод: {args.method}")
-                if args.recurring:
-                    print(f"Повторение: {args.recurring}")
-            else:
-                print("Ошибка добавления напоминания")
-                
-        except ValueError as e:
-            print(f"Ошибка: {e}")
-            print("Используйте формат: YYYY-MM-DD HH:MM")
+        except Exception as e:
+            report_database_error("добавления напоминания", e)
+            return
+        
+        print(f"Напоминание '{args.title}' добавлено с ID: {reminder_id}")
+        print(f"Время: {reminder_time}")
+        print(f"Метод: {args.method}")
+        if args.recurring:
+            print(f"Повторение: {args.recurring}" + (f" (каждые {args.every})" if args.every > 1 else ""))
+    
+    elif args.command == 'list':
+        list_reminders(open_database(), args)
+    
+    elif args.command == 'show':
+        show_reminder(open_database(), args)
+    
+    elif args.command == 'import':
+        import_file(open_database(), args)
+    
+    elif args.command == 'archive':
+        archive(open_database(), args)
+    
+    elif args.command == 'ingest':
+        serve_ingest(open_database(), args)
+    
+    elif args.command == 'profile':
+        profile_ticks(args)
     
     elif args.command == 'run':
-        print("Запуск бота...")
-        bot.run()
+        if args.workers > 1:
+            print(f"Запуск {args.workers} воркеров...")
+            run_workers(args.workers)
+        else:
+            from main import ReminderBot
+            print("Запуск бота...")
+            ReminderBot().run()
     
     elif args.command == 'demo':
         print("Запуск демонстрации...")
@@ -0,0 +1,52 @@
+"""
+Каналы доставки уведомлений
+
+NotificationService хранит реестр каналов: способ отправки -> объект Channel.
+Чтобы добавить канал, достаточно реализовать Channel и зарегистрировать его
+через NotificationService.register_channel.
+"""
+
+from abc import ABC, abstractmethod
+
+class SendDeferred(Exception):
+    """Канал просит повторить отправку не раньше чем через delay секунд
+
+    Бросается вместо долгого ожидания (retry_after Telegram, 4xx SMTP, 429
+    webhook): вызывающий откладывает напоминания, а не задерживает тик.
+    """
+
+    def __init__(self, delay):
+        super().__init__(f"отправка отложена на {delay:.1f} с")
+        self.delay = delay
+
+class Channel(ABC):
+    """Канал доставки: отправка одного или нескольких напоминаний одному пользователю
+
+    send вызывается в синхронном режиме, send_async - в режиме async из
+    цикла событий сервиса. Оба метода возвращают True при успешной отправке.
+    Канал без одного из них не создается (TypeError).
+    """
+
+    @abstractmethod
+    def send(self, user, reminders):
+        """Синхронная отправка"""
+
+    @abstractmethod
+    async def send_async(self, user, reminders):
+        """Отправка из цикла событий сервиса"""
+
+    def close(self):
+        """Освобождение соединений канала"""
+
+class FunctionChannel(Channel):
+    """Канал из готовых функций синхронной и асинхронной отправки"""
+
+    def __init__(self, send, send_async):
+        self._send = send
+        self._send_async = send_async
+
+    def send(self, user, reminders):
+        return self._send(user, reminders)
+
+    async def send_async(self, user, reminders):
+        return await self._send_async(user, reminders)
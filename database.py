@@ -1,9 +1,16 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, Enum
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, Enum, Index, ForeignKey, select, func, insert, update, delete, or_, and_, inspect, text, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import wraps
 import enum
+import uuid
+import threading
 from config import Config
+from metrics import DB_QUERY_SECONDS
 
 Base = declarative_base()
 
@@ -12,12 +19,14 @@ class NotificationMethod(enum.Enum):
     EMAIL = "email"
     TELEGRAM = "telegram"
     CONSOLE = "console"
+    WEBHOOK = "webhook"
 
 class ReminderStatus(enum.Enum):
     """Статусы напоминаний"""
     PENDING = "pending"
     SENT = "sent"
     FAILED = "failed"
+    EXPIRED = "expired"  # устарело и не отправлялось
 
 class User(Base):
     """Модель пользователя"""
@@ -27,6 +36,8 @@ class User(Base):
     name = Column(String(100), nullable=False)
     email = Column(String(255), unique=True, nullable=True)
     telegram_id = Column(String(50), unique=True, nullable=True)
+    webhook_url = Column(String(500), nullable=True)
+    locale = Column(String(10), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     is_active = Column(Boolean, default=True)
 
@@ -35,7 +46,7 @@ class Reminder(Base):
     __tablename__ = 'reminders'
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     title = Column(String(200), nullable=False)
     message = Column(Text, nullable=True)
     reminder_time = Column(DateTime, nullable=False)
@@ -45,27 +56,258 @@ class Reminder(Base):
     sent_at = Column(DateTime, nullable=True)
     is_recurring = Column(Boolean, default=False)
     recurring_interval = Column(String(50), nullable=True)  # daily, weekly, monthly
+    # Правило повторения: шаг в интервалах, исходная точка и номер текущего повторения
+    recurrence_step = Column(Integer, nullable=True)
+    recurrence_anchor = Column(DateTime, nullable=True)
+    recurrence_count = Column(Integer, nullable=True)
+    claimed_by = Column(String(100), nullable=True)  # воркер и метка захвата
+    lease_expires_at = Column(DateTime, nullable=True)
+    # Повторные попытки после ошибки отправки: число неудачных попыток и время следующей
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, nullable=True, index=True)
+    
+    __table_args__ = (
+        Index('ix_reminders_status_reminder_time', 'status', 'reminder_time'),
+        # Выборка напоминаний пользователя по сроку (list_user_reminders)
+        Index('ix_reminders_user_id_reminder_time', 'user_id', 'reminder_time'),
+        # В SQLite без AUTOINCREMENT ID удаленных (архивированных) строк выдаются повторно
+        {'sqlite_autoincrement': True},
+    )
+
+class ReminderDelivery(Base):
+    """Журнал доставок повторяющихся напоминаний"""
+    __tablename__ = 'reminder_deliveries'
+    
+    id = Column(Integer, primary_key=True)
+    reminder_id = Column(Integer, nullable=False, index=True)
+    scheduled_for = Column(DateTime, nullable=False)
+    status = Column(Enum(ReminderStatus), nullable=False)
+    delivered_at = Column(DateTime, nullable=True)
+
+class ArchivedReminder(Base):
+    """Архив обработанных напоминаний (только поля, нужные для истории)"""
+    __tablename__ = 'reminders_archive'
+    
+    id = Column(Integer, primary_key=True)
+    reminder_id = Column(Integer, nullable=False, index=True)  # ID исходного напоминания
+    user_id = Column(Integer, nullable=False, index=True)
+    title = Column(String(200), nullable=False)
+    message = Column(Text, nullable=True)
+    reminder_time = Column(DateTime, nullable=False)
+    notification_method = Column(Enum(NotificationMethod), nullable=True)
+    status = Column(Enum(ReminderStatus), nullable=False)
+    created_at = Column(DateTime, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+# Облегченные проекции для потоковой выборки напоминаний
+ReminderView = namedtuple('ReminderView', [
+    'id', 'user_id', 'title', 'message', 'reminder_time',
+    'notification_method', 'is_recurring', 'recurring_interval',
+    'recurrence_step', 'recurrence_anchor', 'recurrence_count', 'attempts'
+])
+UserView = namedtuple('UserView', ['id', 'name', 'email', 'telegram_id', 'webhook_url', 'locale'])
+
+# Результат отправки для acknowledge_reminders. Для повторяющихся напоминаний
+# заполняются next_time и occurrence: строка переносится на следующее повторение.
+# Для неудачной попытки, которую нужно повторить, заполняются attempts и
+# next_attempt_at: напоминание остается в очереди до next_attempt_at
+Acknowledgement = namedtuple(
+    'Acknowledgement',
+    ['reminder_id', 'status', 'sent_at', 'scheduled_for', 'next_time', 'occurrence',
+     'attempts', 'next_attempt_at'],
+    defaults=(None, None, None, None, None)
+)
+
+_REMINDER_COLUMNS = (
+    Reminder.id, Reminder.user_id, Reminder.title, Reminder.message,
+    Reminder.reminder_time, Reminder.notification_method,
+    Reminder.is_recurring, Reminder.recurring_interval,
+    Reminder.recurrence_step, Reminder.recurrence_anchor, Reminder.recurrence_count,
+    Reminder.attempts
+)
+_USER_COLUMNS = (User.id, User.name, User.email, User.telegram_id, User.webhook_url, User.locale)
+
+def _due_condition(now):
+    """Условие готовности напоминания к отправке: срок наступил, повтор не отложен"""
+    return and_(
+        Reminder.status == ReminderStatus.PENDING,
+        Reminder.reminder_time <= now,
+        or_(Reminder.next_attempt_at.is_(None), Reminder.next_attempt_at <= now)
+    )
+
+def _time_range(since=None, until=None):
+    """Условия на срок напоминания: since < reminder_time <= until"""
+    conditions = []
+    if since is not None:
+        conditions.append(Reminder.reminder_time > since)
+    if until is not None:
+        conditions.append(Reminder.reminder_time <= until)
+    return conditions
+
+def timed_operation(method):
+    """Учет длительности операции с базой в метрике reminder_db_query_seconds"""
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        with DB_QUERY_SECONDS.time(operation=method.__name__):
+            return method(*args, **kwargs)
+    return wrapper
+
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """Настройка нового соединения SQLite: WAL, synchronous=NORMAL, mmap, ожидание блокировки и внешние ключи"""
+    cursor = dbapi_connection.cursor()
+    try:
+        # В режиме WAL чтение не блокирует запись, и диспетчер не ждет писателей
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={int(Config.SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(Config.SQLITE_BUSY_TIMEOUT)}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+    finally:
+        cursor.close()
+
+def create_database_engine(database_url):
+    """Создание engine с профилем настроек для СУБД из database_url
+
+    Профиль выбирается параметром DB_ENGINE_PROFILE: auto - настройки по
+    типу базы (SQLite или PostgreSQL), default - настройки SQLAlchemy по умолчанию.
+    """
+    url = make_url(database_url)
+    if Config.DB_ENGINE_PROFILE == 'default':
+        return create_engine(url)
+    
+    backend = url.get_backend_name()
+    options = {'query_cache_size': Config.DB_STATEMENT_CACHE_SIZE}
+    if backend == 'postgresql':
+        options.update(
+            pool_size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_recycle=Config.DB_POOL_RECYCLE,
+            pool_pre_ping=True
+        )
+        # psycopg 3 кэширует подготовленные на сервере запросы после prepare_threshold выполнений
+        if url.get_driver_name() == 'psycopg':
+            options['connect_args'] = {'prepare_threshold': Config.DB_PREPARE_THRESHOLD}
+    
+    engine = create_engine(url, **options)
+    if backend == 'sqlite':
+        event.listen(engine, 'connect', _configure_sqlite_connection)
+    return engine
 
 class DatabaseManager:
     """Менеджер базы данных"""
     
-    def __init__(self):
-        self.engine = create_engine(Config.DATABASE_URL)
+    def __init__(self, database_url=None):
+        self.engine = create_database_engine(database_url or Config.DATABASE_URL)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self._unit_of_work = threading.local()
+    
+    @contextmanager
+    def unit_of_work(self):
+        """Общее соединение для всех операций блока (например, тика отправки)
+
+        Внутри блока get_session в этом потоке возвращает сессии, привязанные
+        к одному соединению из пула, поэтому последовательные вызовы методов
+        не берут и не возвращают соединение каждый раз. Транзакции остаются
+        короткими: каждый метод по-прежнему фиксирует или откатывает свою.
+        Вложенные блоки используют соединение внешнего.
+        """
+        if getattr(self._unit_of_work, 'connection', None) is not None:
+            yield
+            return
+        
+        connection = self.engine.connect()
+        self._unit_of_work.connection = connection
+        try:
+            yield
+        finally:
+            self._unit_of_work.connection = None
+            connection.close()
     
     def create_tables(self):
         """Создание таблиц в базе данных"""
         Base.metadata.create_all(bind=self.engine)
+        self._add_missing_columns()
+        self._add_missing_enum_values()
+        self._migrate_archive_ids()
+        self._backfill_recurrence_anchors()
+        # create_all не добавляет индексы в уже существующие таблицы
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=self.engine, checkfirst=True)
+    
+    def _add_missing_columns(self):
+        """Добавление в существующие таблицы колонок, появившихся в моделях"""
+        inspector = inspect(self.engine)
+        with self.engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                existing = {column['name'] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing:
+                        continue
+                    column_type = column.type.compile(dialect=self.engine.dialect)
+                    connection.execute(text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                    ))
+    
+    def _add_missing_enum_values(self):
+        """Добавление новых способов отправки и статусов в типы enum PostgreSQL
+
+        create_all не меняет уже созданный тип, а в SQLite значения enum
+        хранятся строкой и новые значения не требуют миграции.
+        """
+        if self.engine.dialect.name != 'postgresql':
+            return
+        with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            for enum_class in (NotificationMethod, ReminderStatus):
+                for value in enum_class:
+                    connection.execute(text(
+                        f"ALTER TYPE {enum_class.__name__.lower()} ADD VALUE IF NOT EXISTS '{value.name}'"
+                    ))
+    
+    def _migrate_archive_ids(self):
+        """Перевод архива, созданного до колонки reminder_id, на собственные ID
+
+        Раньше reminders_archive.id совпадал с ID исходного напоминания: он
+        переносится в reminder_id, а в PostgreSQL последовательность id
+        сдвигается за уже занятые значения.
+        """
+        table = ArchivedReminder.__table__
+        with self.engine.begin() as connection:
+            migrated = connection.execute(
+                update(table).where(table.c.reminder_id.is_(None)).values(reminder_id=table.c.id)
+            ).rowcount
+            if migrated and self.engine.dialect.name == 'postgresql':
+                connection.execute(text(
+                    "SELECT setval(pg_get_serial_sequence('reminders_archive', 'id'), "
+                    "COALESCE(MAX(id), 0) + 1, false) FROM reminders_archive"
+                ))
+    
+    def _backfill_recurrence_anchors(self):
+        """Точка отсчета для повторяющихся напоминаний, созданных до recurrence_anchor
+
+        Повторения считаются от recurrence_anchor по номеру recurrence_count:
+        текущий срок становится точкой отсчета, а номер - нулевым.
+        """
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(Reminder)
+                .where(Reminder.is_recurring.is_(True), Reminder.recurrence_anchor.is_(None))
+                .values(recurrence_anchor=Reminder.reminder_time, recurrence_count=0)
+            )
     
     def get_session(self):
         """Получение сессии базы данных"""
+        connection = getattr(self._unit_of_work, 'connection', None)
+        if connection is not None:
+            return self.SessionLocal(bind=connection)
         return self.SessionLocal()
     
-    def add_user(self, name, email=None, telegram_id=None):
+    def add_user(self, name, email=None, telegram_id=None, webhook_url=None, locale=None):
         """Добавление нового пользователя"""
         session = self.get_session()
         try:
-            user = User(name=name, email=email, telegram_id=telegram_id)
+            user = User(name=name, email=email, telegram_id=telegram_id, webhook_url=webhook_url, locale=locale)
             session.add(user)
             session.commit()
             return user.id
@@ -77,8 +319,14 @@ class DatabaseManager:
     
     def add_reminder(self, user_id, title, message, reminder_time, 
                     notification_method=NotificationMethod.CONSOLE, 
-                    is_recurring=False, recurring_interval=None):
-        """Добавление нового напоминания"""
+                    is_recurring=False, recurring_interval=None, recurrence_step=1):
+        """Добавление нового напоминания
+
+        Повторяющееся напоминание хранится одной строкой-серией: исходное
+        время становится точкой отсчета правила повторения.
+        """
+        if is_recurring and (recurrence_step or 1) < 1:
+            raise ValueError(f"Некорректный шаг повторения: {recurrence_step}")
         session = self.get_session()
         try:
             reminder = Reminder(
@@ -88,7 +336,10 @@ class DatabaseManager:
                 reminder_time=reminder_time,
                 notification_method=notification_method,
                 is_recurring=is_recurring,
-                recurring_interval=recurring_interval
+                recurring_interval=recurring_interval,
+                recurrence_step=recurrence_step if is_recurring else None,
+                recurrence_anchor=reminder_time if is_recurring else None,
+                recurrence_count=0 if is_recurring else None
             )
             session.add(reminder)
             session.commit()
@@ -99,15 +350,243 @@ class DatabaseManager:
         finally:
             session.close()
     
+    @timed_operation
+    def insert_reminders(self, rows):
+        """Вставка пачки напоминаний одним COMMIT, возвращает их ID в порядке rows"""
+        if not rows:
+            return []
+        session = self.get_session()
+        try:
+            ids = list(session.scalars(
+                insert(Reminder).returning(Reminder.id, sort_by_parameter_order=True), rows
+            ))
+            session.commit()
+            return ids
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+    
+    def bulk_insert_users(self, rows):
+        """Вставка пачки пользователей одной командой и одним COMMIT"""
+        self._bulk_insert(User, rows)
+    
+    def bulk_insert_reminders(self, rows):
+        """Вставка пачки напоминаний одной командой и одним COMMIT"""
+        self._bulk_insert(Reminder, rows)
+    
+    def _bulk_insert(self, model, rows):
+        if not rows:
+            return
+        session = self.get_session()
+        try:
+            session.execute(insert(model), rows)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+    
+    def find_existing_user_ids(self, user_ids):
+        """Множество ID из user_ids, для которых есть пользователь"""
+        if not user_ids:
+            return set()
+        session = self.get_session()
+        try:
+            return set(session.scalars(select(User.id).where(User.id.in_(user_ids))))
+        finally:
+            session.close()
+    
+    def find_existing_user_contacts(self, emails, telegram_ids):
+        """Уже занятые email и Telegram ID из переданных множеств"""
+        session = self.get_session()
+        try:
+            taken_emails = set(session.scalars(
+                select(User.email).where(User.email.in_(emails))
+            )) if emails else set()
+            taken_telegram_ids = set(session.scalars(
+                select(User.telegram_id).where(User.telegram_id.in_(telegram_ids))
+            )) if telegram_ids else set()
+            return taken_emails, taken_telegram_ids
+        finally:
+            session.close()
+    
+    @timed_operation
     def get_pending_reminders(self):
         """Получение всех ожидающих напоминаний"""
         session = self.get_session()
         try:
-            reminders = session.query(Reminder).filter(
+            reminders = session.query(Reminder).filter(_due_condition(datetime.utcnow())).all()
+            return reminders
+        finally:
+            session.close()
+    
+    @timed_operation
+    def get_due_reminders_with_users(self):
+        """Получение ожидающих напоминаний вместе с пользователями одним запросом
+
+        Возвращает список пар (reminder, user). Если пользователь не найден,
+        вместо него возвращается None.
+        """
+        session = self.get_session()
+        try:
+            rows = session.query(Reminder, User).outerjoin(
+                User, User.id == Reminder.user_id
+            ).filter(_due_condition(datetime.utcnow())).all()
+            return [(reminder, user) for reminder, user in rows]
+        finally:
+            session.close()
+    
+    def iter_due_reminders(self, batch_size=None, now=None, since=None, until=None):
+        """Потоковая выборка ожидающих напоминаний пачками
+
+        Генератор отдает списки пар (ReminderView, UserView) размером не более
+        batch_size. Используется keyset-пагинация по (reminder_time, id), поэтому
+        каждая пачка читается по индексу отдельным коротким запросом, а память
+        не зависит от размера очереди. Если пользователь не найден, вместо
+        UserView возвращается None. since и until ограничивают reminder_time
+        (см. fetch_due_batch).
+        """
+        batch_size = batch_size or Config.FETCH_BATCH_SIZE
+        now = now or datetime.utcnow()
+        after = None
+        
+        while True:
+            batch = self.fetch_due_batch(batch_size, now=now, after=after, since=since, until=until)
+            if not batch:
+                return
+            yield batch
+            
+            if len(batch) < batch_size:
+                return
+            after = (batch[-1][0].reminder_time, batch[-1][0].id)
+    
+    def fetch_due_batch(self, batch_size, now=None, after=None, since=None, until=None):
+        """Одна пачка ожидающих напоминаний в порядке (reminder_time, id)
+
+        after - ключ (reminder_time, id) последнего напоминания предыдущей
+        пачки. since и until ограничивают срок напоминания: reminder_time > since
+        и reminder_time <= until. Возвращает список пар (ReminderView, UserView).
+        """
+        query = self._due_query(now or datetime.utcnow())
+        if after is not None:
+            last_time, last_id = after
+            query = query.where(or_(
+                Reminder.reminder_time > last_time,
+                and_(Reminder.reminder_time == last_time, Reminder.id > last_id)
+            ))
+        query = query.where(*_time_range(since, until))
+        query = query.order_by(Reminder.reminder_time, Reminder.id).limit(batch_size)
+        
+        session = self.get_session()
+        try:
+            with DB_QUERY_SECONDS.time(operation='iter_due_reminders'):
+                rows = session.execute(query).all()
+        finally:
+            session.close()
+        return self._to_views(rows)
+    
+    @timed_operation
+    def claim_due_reminders(self, worker_id, batch_size=None, lease_seconds=None, now=None, since=None, until=None):
+        """Атомарный захват пачки ожидающих напоминаний воркером
+
+        Напоминания без аренды или с истекшей арендой помечаются меткой захвата
+        и сроком аренды одним UPDATE. На PostgreSQL подзапрос выбирает строки
+        с FOR UPDATE SKIP LOCKED, поэтому конкурирующие воркеры не ждут друг
+        друга; на SQLite запись сериализуется блокировкой базы. Если воркер
+        упал, его аренда истекает, и напоминания захватывает другой воркер.
+        since и until ограничивают reminder_time, как в fetch_due_batch.
+        Возвращает список пар (ReminderView, UserView).
+        """
+        batch_size = batch_size or Config.FETCH_BATCH_SIZE
+        lease_seconds = lease_seconds or Config.CLAIM_LEASE_SECONDS
+        now = now or datetime.utcnow()
+        claim_token = f"{worker_id}:{uuid.uuid4().hex[:12]}"
+        
+        candidates = select(Reminder.id).where(
+            _due_condition(now),
+            or_(Reminder.lease_expires_at.is_(None), Reminder.lease_expires_at < now),
+            *_time_range(since, until)
+        ).order_by(Reminder.reminder_time, Reminder.id).limit(batch_size).with_for_update(skip_locked=True)
+        
+        session = self.get_session()
+        try:
+            claimed = session.execute(
+                update(Reminder).where(Reminder.id.in_(candidates.scalar_subquery())).values(
+                    claimed_by=claim_token,
+                    lease_expires_at=now + timedelta(seconds=lease_seconds)
+                ).execution_options(synchronize_session=False)
+            ).rowcount
+            session.commit()
+            
+            if not claimed:
+                return []
+            
+            rows = session.execute(
+                self._due_query(now).where(Reminder.claimed_by == claim_token)
+                .order_by(Reminder.reminder_time, Reminder.id)
+            ).all()
+            return self._to_views(rows)
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+    
+    def _due_query(self, now):
+        """Проекция готовых к отправке напоминаний вместе с пользователями
+
+        Напоминания, ожидающие повторной попытки, попадают в выборку тем же
+        запросом, как только наступает их next_attempt_at.
+        """
+        return select(*_REMINDER_COLUMNS, *_USER_COLUMNS).outerjoin(
+            User, User.id == Reminder.user_id
+        ).where(_due_condition(now))
+    
+    def _to_views(self, rows):
+        """Преобразование строк проекции в пары (ReminderView, UserView)"""
+        reminder_width = len(_REMINDER_COLUMNS)
+        views = []
+        for row in rows:
+            reminder = ReminderView(*row[:reminder_width])
+            user = UserView(*row[reminder_width:]) if row[reminder_width] is not None else None
+            views.append((reminder, user))
+        return views
+    
+    @timed_operation
+    def count_due_reminders(self, now=None):
+        """Количество ожидающих напоминаний, срок которых наступил"""
+        session = self.get_session()
+        try:
+            return session.query(Reminder).filter(_due_condition(now or datetime.utcnow())).count()
+        finally:
+            session.close()
+    
+    @timed_operation
+    def get_upcoming_reminder_times(self, until, limit=1000):
+        """Получение ближайших сроков ожидающих напоминаний (по возрастанию)
+
+        Для напоминаний, ожидающих повторной попытки, сроком считается
+        next_attempt_at. Каждая часть объединения читается по своему индексу.
+        """
+        session = self.get_session()
+        try:
+            first_attempts = select(Reminder.reminder_time.label('due_at')).where(
+                Reminder.status == ReminderStatus.PENDING,
+                Reminder.reminder_time <= until,
+                Reminder.next_attempt_at.is_(None)
+            )
+            retries = select(Reminder.next_attempt_at.label('due_at')).where(
                 Reminder.status == ReminderStatus.PENDING,
-                Reminder.reminder_time <= datetime.utcnow()
+                Reminder.next_attempt_at <= until
+            )
+            due_times = first_attempts.union(retries).subquery()
+            rows = session.execute(
+                select(due_times.c.due_at).order_by(due_times.c.due_at).limit(limit)
             ).all()
-            return reminders
+            return [row.due_at for row in rows]
         finally:
             session.close()
     
@@ -127,6 +606,177 @@ class DatabaseManager:
         finally:
             session.close()
     
+    @timed_operation
+    def acknowledge_reminders(self, acknowledgements):
+        """Массовое обновление статусов напоминаний в одной транзакции
+
+        acknowledgements - последовательность Acknowledgement или кортежей
+        (reminder_id, status, sent_at). Разовые напоминания получают итоговый
+        статус; повторяющиеся остаются PENDING и переносятся на следующее
+        повторение, а результат доставки пишется в журнал reminder_deliveries.
+        Неудачные попытки с заполненным next_attempt_at остаются PENDING и
+        откладываются до этого времени.
+        Строки обновляются пакетными UPDATE по первичному ключу, один COMMIT
+        на всю пачку. Возвращает количество обработанных напоминаний.
+        """
+        with_sent_at = []
+        without_sent_at = []
+        advanced = []
+        retried = []
+        deliveries = []
+        for ack in acknowledgements:
+            ack = Acknowledgement(*ack)
+            if ack.next_attempt_at is not None:
+                retried.append({
+                    'id': ack.reminder_id,
+                    'attempts': ack.attempts,
+                    'next_attempt_at': ack.next_attempt_at,
+                    'claimed_by': None,
+                    'lease_expires_at': None
+                })
+            elif ack.next_time is not None:
+                advanced.append({
+                    'id': ack.reminder_id,
+                    'reminder_time': ack.next_time,
+                    'recurrence_count': ack.occurrence,
+                    'attempts': 0,
+                    'next_attempt_at': None,
+                    'claimed_by': None,
+                    'lease_expires_at': None
+                })
+                deliveries.append({
+                    'reminder_id': ack.reminder_id,
+                    'scheduled_for': ack.scheduled_for,
+                    'status': ack.status,
+                    'delivered_at': ack.sent_at
+                })
+            elif ack.sent_at is not None:
+                with_sent_at.append({'id': ack.reminder_id, 'status': ack.status, 'sent_at': ack.sent_at})
+            else:
+                without_sent_at.append({'id': ack.reminder_id, 'status': ack.status})
+        
+        total = len(with_sent_at) + len(without_sent_at) + len(advanced) + len(retried)
+        if not total:
+            return 0
+        
+        session = self.get_session()
+        try:
+            for params in (with_sent_at, without_sent_at, advanced, retried):
+                if params:
+                    session.execute(update(Reminder), params)
+            if deliveries:
+                session.execute(insert(ReminderDelivery), deliveries)
+            session.commit()
+            return total
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+    
+    @timed_operation
+    def archive_reminder_batch(self, before, batch_size, export=None):
+        """Перенос пачки обработанных напоминаний из рабочей таблицы в архив
+
+        Берутся напоминания со статусом SENT, FAILED или EXPIRED, срок и время отправки
+        которых раньше before. Строки пачки копируются в reminders_archive или,
+        если задана функция export, передаются ей списком словарей; затем
+        удаляются из reminders в той же транзакции. Возвращает число
+        перенесенных напоминаний; меньше batch_size - архивировать больше нечего.
+        """
+        archived_columns = [column.name for column in ArchivedReminder.__table__.columns
+                            if column.name not in ('id', 'reminder_id', 'archived_at')]
+        session = self.get_session()
+        try:
+            rows = session.execute(
+                select(Reminder.id, *(getattr(Reminder, name) for name in archived_columns)).where(
+                    Reminder.status.in_([ReminderStatus.SENT, ReminderStatus.FAILED, ReminderStatus.EXPIRED]),
+                    Reminder.reminder_time < before,
+                    or_(Reminder.sent_at.is_(None), Reminder.sent_at < before)
+                ).limit(batch_size)
+            ).mappings().all()
+            if not rows:
+                return 0
+            
+            rows = [dict(row) for row in rows]
+            if export is not None:
+                export(rows)
+            else:
+                archived_at = datetime.utcnow()
+                session.execute(insert(ArchivedReminder), [
+                    {**{name: row[name] for name in archived_columns}, 'reminder_id': row['id'], 'archived_at': archived_at}
+                    for row in rows
+                ])
+            session.execute(delete(Reminder).where(Reminder.id.in_([row['id'] for row in rows])))
+            session.commit()
+            return len(rows)
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+    
+    def _user_reminders_query(self, query, user_id, status=None, since=None, until=None):
+        """Фильтры выборки напоминаний пользователя: статус и since < reminder_time <= until"""
+        query = query.where(Reminder.user_id == user_id, *_time_range(since, until))
+        if status is not None:
+            query = query.where(Reminder.status == status)
+        return query
+    
+    @timed_operation
+    def list_user_reminders(self, user_id, status=None, since=None, until=None, limit=50, after=None):
+        """Страница напоминаний пользователя в порядке (reminder_time, id)
+
+        after - ключ (reminder_time, id) последнего напоминания предыдущей
+        страницы. Страница читается по индексу (user_id, reminder_time), поэтому
+        время не зависит ни от размера таблицы, ни от номера страницы.
+        """
+        query = self._user_reminders_query(select(Reminder), user_id, status, since, until)
+        if after is not None:
+            last_time, last_id = after
+            query = query.where(or_(
+                Reminder.reminder_time > last_time,
+                and_(Reminder.reminder_time == last_time, Reminder.id > last_id)
+            ))
+        session = self.get_session()
+        try:
+            return list(session.scalars(query.order_by(Reminder.reminder_time, Reminder.id).limit(limit)))
+        finally:
+            session.close()
+    
+    @timed_operation
+    def count_user_reminders(self, user_id, status=None, since=None, until=None):
+        """Количество напоминаний пользователя без чтения самих строк"""
+        session = self.get_session()
+        try:
+            return session.scalar(self._user_reminders_query(
+                select(func.count()).select_from(Reminder), user_id, status, since, until
+            ))
+        finally:
+            session.close()
+    
+    def get_reminder(self, reminder_id):
+        """Напоминание по ID: из рабочей таблицы или, если оно уже перенесено, из архива
+
+        Возвращает пару (напоминание, список последних доставок из журнала
+        reminder_deliveries) или (None, []).
+        """
+        session = self.get_session()
+        try:
+            reminder = session.get(Reminder, reminder_id) or session.scalars(
+                select(ArchivedReminder).where(ArchivedReminder.reminder_id == reminder_id)
+                .order_by(ArchivedReminder.id.desc()).limit(1)
+            ).first()
+            if reminder is None:
+                return None, []
+            deliveries = list(session.scalars(
+                select(ReminderDelivery).where(ReminderDelivery.reminder_id == reminder_id)
+                .order_by(ReminderDelivery.id.desc()).limit(10)
+            ))
+            return reminder, deliveries
+        finally:
+            session.close()
+    
     def get_user_by_id(self, user_id):
         """Получение пользователя по ID"""
         session = self.get_session()
@@ -0,0 +1,19 @@
+def group_for_digest(batch, window_seconds, max_items):
+    """Группировка напоминаний в дайджесты по пользователю и способу отправки
+
+    batch - пары (reminder, user), упорядоченные по reminder_time. В один
+    дайджест попадают напоминания, срок которых отстоит от первого в группе
+    не более чем на window_seconds секунд, но не больше max_items штук.
+    Возвращает список пар (user, reminders) в порядке первого напоминания.
+    """
+    open_groups = {}
+    digests = []
+    for reminder, user in batch:
+        key = (user.id, reminder.notification_method)
+        group = open_groups.get(key)
+        if (group is None or len(group[1]) >= max_items
+                or (reminder.reminder_time - group[1][0].reminder_time).total_seconds() > window_seconds):
+            group = open_groups[key] = (user, [])
+            digests.append(group)
+        group[1].append(reminder)
+    return digests
@@ -0,0 +1,274 @@
+"""
+Локальные заглушки каналов доставки для бенчмарков и ручной проверки
+"""
+
+import json
+import time
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Обработчик одной SMTP сессии (без STARTTLS и авторизации)"""
+
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self._reply("220 fake-smtp ready")
+        messages_in_session = 0
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+
+            if command.startswith(('EHLO', 'HELO')):
+                self._reply("250 fake-smtp")
+            elif command.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self._reply("250 OK")
+            elif command == 'DATA':
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                if server.latency:
+                    time.sleep(server.latency)
+                with server.lock:
+                    server.messages += 1
+                messages_in_session += 1
+                self._reply("250 OK queued")
+                # Имитация разрыва соединения сервером
+                if server.drop_after and messages_in_session >= server.drop_after:
+                    return
+            elif command == 'QUIT':
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+class FakeSMTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Локальный SMTP сервер, считающий соединения и принятые письма
+
+    latency - задержка ответа на DATA в секундах,
+    drop_after - разрывать соединение после указанного числа писем.
+    """
+
+    daemon_threads = True
+    # Очередь listen по умолчанию (5) переполняется параллельными подключениями: SYN повторяется через 1 с
+    request_queue_size = 128
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, drop_after=0):
+        super().__init__((host, port), _SMTPHandler)
+        self.latency = latency
+        self.drop_after = drop_after
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """Запуск сервера в фоновом потоке"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Остановка сервера"""
+        self.shutdown()
+        self.server_close()
+
+class _TelegramHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов к методам Bot API"""
+
+    protocol_version = 'HTTP/1.1'
+    # Как и у webhook: без TCP_NODELAY каждый ответ ждет delayed ACK (~40 мс)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if server.latency:
+            time.sleep(server.latency)
+
+        method = self.path.rsplit('/', 1)[-1]
+        try:
+            params = json.loads(body) if body else {}
+        except ValueError:
+            params = {}
+
+        with server.lock:
+            server.requests += 1
+            throttled = (method == 'sendMessage' and server.throttle_every
+                         and server.requests % server.throttle_every == 0)
+            if throttled:
+                server.throttled += 1
+            elif method == 'sendMessage':
+                server.messages += 1
+            message_id = server.requests
+
+        if throttled:
+            # Ответ flood control Telegram
+            self._respond(429, {
+                'ok': False,
+                'error_code': 429,
+                'description': f"Too Many Requests: retry after {server.retry_after}",
+                'parameters': {'retry_after': server.retry_after}
+            })
+            return
+
+        if method == 'sendMessage':
+            result = {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id') or 0), 'type': 'private'},
+                'text': params.get('text', '')
+            }
+        elif method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'fake', 'username': 'fake_bot'}
+        else:
+            result = True
+        self._respond(200, {'ok': True, 'result': result})
+
+    def _respond(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+class FakeTelegramServer(ThreadingHTTPServer):
+    """Локальная заглушка Telegram Bot API
+
+    Принимает запросы вида /bot<token>/<method> и отвечает успехом
+    с задержкой latency секунд. Адрес для Config.TELEGRAM_BASE_URL - base_url.
+    throttle_every - отвечать 429 с retry_after на каждый N-й запрос.
+    """
+
+    daemon_threads = True
+    # См. FakeSMTPServer
+    request_queue_size = 128
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, throttle_every=0, retry_after=1):
+        super().__init__((host, port), _TelegramHandler)
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.messages = 0
+        self.throttled = 0
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self):
+        """Запуск сервера в фоновом потоке"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Остановка сервера"""
+        self.shutdown()
+        self.server_close()
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    """Обработчик POST запросов webhook"""
+
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят отдельными записями: без TCP_NODELAY ответ ждет delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if server.latency:
+            time.sleep(server.latency)
+        try:
+            reminders = json.loads(body).get('reminders', [])
+        except (ValueError, AttributeError):
+            self._respond(400, {'error': 'invalid json'})
+            return
+
+        with server.lock:
+            server.requests += 1
+            throttled = server.throttle_every and server.requests % server.throttle_every == 0
+            if throttled:
+                server.throttled += 1
+            else:
+                server.messages += len(reminders)
+                server.max_batch = max(server.max_batch, len(reminders))
+
+        if throttled:
+            self._respond(429, {'error': 'too many requests'}, {'Retry-After': str(server.retry_after)})
+            return
+        self._respond(200, {'accepted': len(reminders)})
+
+    def _respond(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+class FakeWebhookServer(ThreadingHTTPServer):
+    """Локальный HTTP endpoint для канала webhook
+
+    Считает запросы, принятые напоминания и наибольшую пачку. Отвечает
+    с задержкой latency секунд, на каждый throttle_every-й запрос - 429
+    с заголовком Retry-After.
+    """
+
+    daemon_threads = True
+    # См. FakeSMTPServer
+    request_queue_size = 128
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, throttle_every=0, retry_after=1):
+        super().__init__((host, port), _WebhookHandler)
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.messages = 0
+        self.throttled = 0
+        self.max_batch = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/reminders"
+
+    def start(self):
+        """Запуск сервера в фоновом потоке"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Остановка сервера"""
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,228 @@
+"""
+Потоковый импорт пользователей и напоминаний из CSV и JSONL
+"""
+
+import csv
+import json
+import logging
+from datetime import datetime, timezone
+from itertools import islice
+from database import NotificationMethod
+from recurrence import INTERVALS
+
+DATE_FORMATS = (
+    '%Y-%m-%d %H:%M',
+    '%d.%m.%Y %H:%M',
+    '%d/%m/%Y %H:%M'
+)
+
+class ImportStats:
+    """Итоги импорта"""
+
+    def __init__(self):
+        self.read = 0
+        self.imported = 0
+        self.rejected = 0
+
+def detect_format(path, file_format=None):
+    """Формат файла по явному указанию или расширению"""
+    if file_format:
+        return file_format
+    return 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+def iter_records(stream, file_format):
+    """Построчное чтение записей: пары (номер строки, словарь)"""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, ValueError(f"Некорректный JSON: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield line_number, ValueError("Строка JSONL должна быть объектом")
+                continue
+            yield line_number, record
+
+def _text(record, field, required=False, max_length=None):
+    """Строковое поле записи с проверкой обязательности и длины"""
+    value = record.get(field)
+    value = str(value).strip() if value is not None else ''
+    if required and not value:
+        raise ValueError(f"Не заполнено поле {field}")
+    if max_length and len(value) > max_length:
+        raise ValueError(f"Поле {field} длиннее {max_length} символов")
+    return value or None
+
+def parse_time(value):
+    """Разбор времени напоминания: ISO 8601 или форматы CLI
+
+    Время со смещением (2026-10-17T10:00:00+03:00) переводится в UTC:
+    в базе сроки хранятся без часового пояса и сравниваются с utcnow.
+    """
+    if isinstance(value, str):
+        value = value.strip()
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            pass
+        else:
+            if parsed.tzinfo is not None:
+                parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+            return parsed
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+    raise ValueError(f"Неверный формат даты: {value}")
+
+def _webhook_url(value):
+    if value and not value.startswith(('http://', 'https://')):
+        raise ValueError(f"Некорректный webhook_url: {value}")
+    return value
+
+def validate_user(record):
+    """Проверка записи пользователя, возвращает параметры вставки"""
+    email = _text(record, 'email', max_length=255)
+    if email and '@' not in email:
+        raise ValueError(f"Некорректный email: {email}")
+    return {
+        'name': _text(record, 'name', required=True, max_length=100),
+        'email': email,
+        'telegram_id': _text(record, 'telegram_id', max_length=50),
+        'webhook_url': _webhook_url(_text(record, 'webhook_url', max_length=500)),
+        'locale': _text(record, 'locale', max_length=10)
+    }
+
+def validate_reminder(record):
+    """Проверка записи напоминания, возвращает параметры вставки"""
+    try:
+        user_id = int(record.get('user_id'))
+    except (TypeError, ValueError):
+        raise ValueError(f"Некорректный user_id: {record.get('user_id')}")
+
+    reminder_time = parse_time(record.get('reminder_time') or record.get('datetime'))
+
+    method = _text(record, 'method') or 'console'
+    try:
+        notification_method = NotificationMethod(method.lower())
+    except ValueError:
+        raise ValueError(f"Неизвестный метод уведомления: {method}")
+
+    interval = _text(record, 'recurring')
+    if interval and interval not in INTERVALS:
+        raise ValueError(f"Неизвестный интервал повторения: {interval}")
+    try:
+        step = int(record.get('every') or 1)
+    except (TypeError, ValueError):
+        raise ValueError(f"Некорректный шаг повторения: {record.get('every')}")
+    if step < 1:
+        raise ValueError(f"Некорректный шаг повторения: {step}")
+
+    return {
+        'user_id': user_id,
+        'title': _text(record, 'title', required=True, max_length=200),
+        'message': _text(record, 'message') or '',
+        'reminder_time': reminder_time,
+        'notification_method': notification_method,
+        'is_recurring': interval is not None,
+        'recurring_interval': interval,
+        'recurrence_step': step if interval else None,
+        'recurrence_anchor': reminder_time if interval else None,
+        'recurrence_count': 0 if interval else None
+    }
+
+class Importer:
+    """Импорт записей пачками: одна вставка и один COMMIT на пачку
+
+    В памяти одновременно находится не больше одной пачки, поэтому объем
+    памяти не зависит от размера входного файла. Отклоненные строки
+    передаются в on_reject вместе с номером строки и причиной.
+    """
+
+    def __init__(self, db_manager, chunk_size=1000, on_reject=None):
+        self.logger = logging.getLogger(__name__)
+        self.db_manager = db_manager
+        self.chunk_size = chunk_size
+        self.on_reject = on_reject or (lambda line_number, record, reason: None)
+
+    def import_users(self, records):
+        """Импорт пользователей из итератора (номер строки, запись)"""
+        return self._import(records, validate_user, self._insert_users)
+
+    def import_reminders(self, records):
+        """Импорт напоминаний из итератора (номер строки, запись)"""
+        return self._import(records, validate_reminder, self._insert_reminders)
+
+    def _import(self, records, validate, insert_chunk):
+        stats = ImportStats()
+        records = iter(records)
+        while True:
+            raw_chunk = list(islice(records, self.chunk_size))
+            if not raw_chunk:
+                return stats
+
+            chunk = []
+            for line_number, record in raw_chunk:
+                stats.read += 1
+                if isinstance(record, Exception):
+                    self._reject(stats, line_number, None, str(record))
+                    continue
+                try:
+                    chunk.append((line_number, record, validate(record)))
+                except ValueError as e:
+                    self._reject(stats, line_number, record, str(e))
+            if chunk:
+                insert_chunk(chunk, stats)
+
+    def _reject(self, stats, line_number, record, reason):
+        stats.rejected += 1
+        self.on_reject(line_number, record, reason)
+
+    def _insert_users(self, chunk, stats):
+        """Вставка пачки пользователей без дубликатов email и telegram_id"""
+        emails = {row['email'] for _, _, row in chunk if row['email']}
+        telegram_ids = {row['telegram_id'] for _, _, row in chunk if row['telegram_id']}
+        taken_emails, taken_telegram_ids = self.db_manager.find_existing_user_contacts(emails, telegram_ids)
+
+        accepted = []
+        for line_number, record, row in chunk:
+            if row['email'] and row['email'] in taken_emails:
+                self._reject(stats, line_number, record, f"Email уже используется: {row['email']}")
+            elif row['telegram_id'] and row['telegram_id'] in taken_telegram_ids:
+                self._reject(stats, line_number, record, f"Telegram ID уже используется: {row['telegram_id']}")
+            else:
+                taken_emails.add(row['email'])
+                taken_telegram_ids.add(row['telegram_id'])
+                accepted.append((line_number, record, row))
+        self._commit_chunk(accepted, stats, self.db_manager.bulk_insert_users)
+
+    def _insert_reminders(self, chunk, stats):
+        """Вставка пачки напоминаний для существующих пользователей"""
+        existing = self.db_manager.find_existing_user_ids({row['user_id'] for _, _, row in chunk})
+
+        accepted = []
+        for line_number, record, row in chunk:
+            if row['user_id'] not in existing:
+                self._reject(stats, line_number, record, f"Пользователь с ID {row['user_id']} не найден")
+            else:
+                accepted.append((line_number, record, row))
+        self._commit_chunk(accepted, stats, self.db_manager.bulk_insert_reminders)
+
+    def _commit_chunk(self, accepted, stats, bulk_insert):
+        if not accepted:
+            return
+        try:
+            bulk_insert([row for _, _, row in accepted])
+            stats.imported += len(accepted)
+        except Exception as e:
+            self.logger.error(f"Ошибка вставки пачки из {len(accepted)} записей: {e}")
+            for line_number, record, _ in accepted:
+                self._reject(stats, line_number, record, f"Ошибка вставки пачки: {e}")
@@ -0,0 +1,251 @@
+"""
+Прием напоминаний по HTTP с групповой фиксацией
+
+POST /reminders принимает одно напоминание (объект JSON) или пачку (массив
+или {"reminders": [...]}) в формате импорта: user_id, title, message,
+reminder_time, method, recurring, every. Запросы всех клиентов попадают в
+общую очередь, а один поток записи объединяет их в транзакции: до
+max_batch напоминаний, ожидание следующих запросов не дольше interval
+секунд. Ответ {"ids": [...], "errors": [...]} отправляется после COMMIT;
+для SQLite поток записи использует synchronous=FULL, поэтому принятые
+напоминания не теряются и при сбое питания.
+"""
+
+import json
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sqlalchemy import text
+from config import Config
+from importer import validate_reminder
+from metrics import INGEST_COMMIT_SIZE
+
+# Предел ожидания COMMIT обработчиком запроса, секунд
+_COMMIT_TIMEOUT = 30
+
+class _Submission:
+    """Напоминания одного запроса и Future с результатом их записи"""
+
+    __slots__ = ('rows', 'future')
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.future = Future()
+
+class GroupCommitter:
+    """Поток записи, объединяющий напоминания разных запросов в одну транзакцию
+
+    submit возвращает Future, который получает список ID (None для
+    отклоненных строк) и словарь ошибок {индекс: причина} после COMMIT.
+    on_commit вызывается со списком сроков записанных напоминаний.
+    """
+
+    def __init__(self, db_manager, interval=None, max_batch=None, max_pending=None, on_commit=None):
+        self.logger = logging.getLogger(__name__)
+        self.db_manager = db_manager
+        self.interval = Config.INGEST_COMMIT_INTERVAL if interval is None else interval
+        self.max_batch = max(1, max_batch or Config.INGEST_MAX_BATCH)
+        self.on_commit = on_commit
+        self._queue = queue.Queue(maxsize=max_pending or Config.INGEST_MAX_PENDING)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='ingest-commit', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Остановка после записи уже принятых запросов"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def submit(self, rows):
+        """Постановка проверенных строк в очередь записи
+
+        Если очередь заполнена, бросает queue.Full - клиенту стоит повторить позже.
+        """
+        submission = _Submission(rows)
+        self._queue.put_nowait(submission)
+        return submission.future
+
+    def _run(self):
+        # Поток держит одно соединение, на котором фиксируются все группы
+        with self.db_manager.unit_of_work():
+            self._set_synchronous('FULL')
+            try:
+                while not (self._stop_event.is_set() and self._queue.empty()):
+                    group = []
+                    try:
+                        group = self._collect_group()
+                        if group:
+                            self._commit_group(group)
+                    except Exception as e:
+                        # Ошибка одной группы не должна останавливать поток записи
+                        self.logger.error(f"Ошибка обработки группы напоминаний: {e}")
+                        for submission in group:
+                            if not submission.future.done():
+                                submission.future.set_exception(e)
+            finally:
+                self._set_synchronous('NORMAL')
+
+    def _set_synchronous(self, mode):
+        """Режим fsync соединения SQLite: в WAL с NORMAL COMMIT не переживает сбой питания"""
+        if self.db_manager.engine.dialect.name == 'sqlite':
+            session = self.db_manager.get_session()
+            try:
+                session.execute(text(f"PRAGMA synchronous={mode}"))
+            finally:
+                session.close()
+
+    def _collect_group(self):
+        """Запросы для одной транзакции: все, что пришло за interval после первого"""
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+
+        group = [first]
+        size = len(first.rows)
+        deadline = time.monotonic() + self.interval
+        while size < self.max_batch:
+            try:
+                submission = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    submission = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            group.append(submission)
+            size += len(submission.rows)
+        return group
+
+    def _commit_group(self, group):
+        """Вставка напоминаний группы одной транзакцией и выдача ID запросам"""
+        user_ids = {row['user_id'] for submission in group for row in submission.rows}
+        try:
+            existing = self.db_manager.find_existing_user_ids(user_ids)
+            accepted = [row for submission in group for row in submission.rows if row['user_id'] in existing]
+            ids = iter(self.db_manager.insert_reminders(accepted))
+        except Exception as e:
+            self.logger.error(f"Ошибка записи {sum(len(s.rows) for s in group)} напоминаний: {e}")
+            for submission in group:
+                submission.future.set_exception(e)
+            return
+
+        INGEST_COMMIT_SIZE.observe(len(accepted))
+        for submission in group:
+            result, errors = [], {}
+            for index, row in enumerate(submission.rows):
+                if row['user_id'] in existing:
+                    result.append(next(ids))
+                else:
+                    result.append(None)
+                    errors[index] = f"Пользователь с ID {row['user_id']} не найден"
+            submission.future.set_result((result, errors))
+
+        if accepted and self.on_commit:
+            try:
+                self.on_commit([row['reminder_time'] for row in accepted])
+            except Exception as e:
+                # Напоминания уже записаны, планировщик найдет их при следующей проверке
+                self.logger.error(f"Ошибка уведомления о записанных напоминаниях: {e}")
+
+class _IngestHandler(BaseHTTPRequestHandler):
+    """Обработчик POST /reminders"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/reminders':
+            self._respond(404, {'error': 'not found'})
+            return
+
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+        except ValueError:
+            self._respond(400, {'error': 'Некорректный JSON'})
+            return
+        if isinstance(payload, dict):
+            payload = payload['reminders'] if isinstance(payload.get('reminders'), list) else [payload]
+        if not isinstance(payload, list) or not payload:
+            self._respond(400, {'error': 'Ожидается напоминание или список напоминаний'})
+            return
+
+        rows, positions, errors = [], [], {}
+        for index, record in enumerate(payload):
+            try:
+                if not isinstance(record, dict):
+                    raise ValueError("Напоминание должно быть объектом")
+                rows.append(validate_reminder(record))
+                positions.append(index)
+            except ValueError as e:
+                errors[index] = str(e)
+
+        ids = [None] * len(payload)
+        if rows:
+            try:
+                committed, commit_errors = self.server.committer.submit(rows).result(timeout=_COMMIT_TIMEOUT)
+            except queue.Full:
+                self._respond(503, {'error': 'Очередь записи переполнена, повторите позже'})
+                return
+            except Exception as e:
+                self._respond(500, {'error': f"Ошибка записи: {e}"})
+                return
+            for offset, reminder_id in enumerate(committed):
+                ids[positions[offset]] = reminder_id
+            errors.update({positions[offset]: reason for offset, reason in commit_errors.items()})
+
+        status = 201 if not errors else (200 if any(ids) else 422)
+        self._respond(status, {
+            'ids': ids,
+            'errors': [{'index': index, 'error': reason} for index, reason in sorted(errors.items())]
+        })
+
+    def _respond(self, status, body):
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+class IngestServer(ThreadingHTTPServer):
+    """HTTP сервер приема напоминаний, работающий в фоновом потоке"""
+
+    daemon_threads = True
+    # Очередь входящих соединений: при 5 по умолчанию одновременные клиенты получают RST
+    request_queue_size = 128
+
+    def __init__(self, host, port, db_manager, on_commit=None, **committer_options):
+        super().__init__((host, port), _IngestHandler)
+        self.committer = GroupCommitter(db_manager, on_commit=on_commit, **committer_options)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/reminders"
+
+    def start(self):
+        self.committer.start()
+        self._thread = threading.Thread(target=self.serve_forever, name='ingest', daemon=True)
+        self._thread.start()
+        logging.getLogger(__name__).info(f"Прием напоминаний на {self.url}")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.committer.stop()
@@ -0,0 +1,86 @@
+"""
+Настройка логирования без блокировки отправки
+
+Потоки бота только кладут записи в очередь (QueueHandler), а форматирует и
+пишет их в файл и консоль фоновый поток QueueListener. Файл лога
+ротируется по размеру. В формате json каждая запись - одна строка JSON с
+полями reminder_id, channel и latency, если они переданы через extra.
+"""
+
+import json
+import queue
+import atexit
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import Config
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Поля, которые передаются в лог через extra и попадают в JSON
+STRUCTURED_FIELDS = ('reminder_id', 'channel', 'latency', 'user_id', 'attempt')
+
+_listener = None
+
+class JsonFormatter(logging.Formatter):
+    """Форматирование записи лога в одну строку JSON"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler, который не форматирует запись в вызывающем потоке
+
+    Очередь не покидает процесс, поэтому запись передается как есть, а
+    подстановка аргументов и форматирование выполняются в потоке слушателя.
+    """
+
+    def prepare(self, record):
+        return record
+
+def configure_logging(level=None, log_file=None, log_format=None, max_bytes=None, backup_count=None):
+    """Подключение очереди логирования к корневому логгеру
+
+    Если логирование процесса уже настроено (например, бенчмарком),
+    ничего не меняется. Возвращает запущенный QueueListener или None.
+    """
+    global _listener
+    root = logging.getLogger()
+    if root.handlers:
+        return _listener
+
+    log_format = log_format or Config.LOG_FORMAT
+    formatter = JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    log_file = log_file if log_file is not None else Config.LOG_FILE
+    if log_file:
+        handlers.append(RotatingFileHandler(
+            log_file,
+            maxBytes=max_bytes if max_bytes is not None else Config.LOG_MAX_BYTES,
+            backupCount=backup_count if backup_count is not None else Config.LOG_BACKUP_COUNT,
+            encoding='utf-8'
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    root.setLevel(getattr(logging, level or Config.LOG_LEVEL))
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Записи, оставшиеся в очереди, дописываются при завершении процесса
+    atexit.register(_listener.stop)
+    return _listener
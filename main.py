@@ -4,12 +4,25 @@ Reminder Bot - Бот для напоминаний
 Поддерживает отправку напоминаний через email, Telegram и консоль
 """
 
-import time
+import os
+import socket
 import logging
+import threading
 import schedule
 from datetime import datetime, timedelta
-from database import DatabaseManager, NotificationMethod, ReminderStatus
+from database import DatabaseManager, NotificationMethod, ReminderStatus, Acknowledgement
 from notification_service import NotificationService
+from async_dispatcher import AsyncDispatcher
+from channels import SendDeferred
+from scheduler import ReminderScheduler
+from recurrence import next_occurrence
+from retry_policy import backoff_delay
+from digest import group_for_digest
+from metrics import (
+    MetricsServer, BACKLOG, DISPATCH_LAG_SECONDS, DIGEST_SIZE, CATCHUP_BATCHES,
+    REMINDERS_SENT, REMINDERS_FAILED, REMINDERS_RETRIED, REMINDERS_EXPIRED, REMINDERS_DEFERRED
+)
+from logging_setup import configure_logging
 from config import Config
 
 class ReminderBot:
@@ -18,18 +31,22 @@ class ReminderBot:
     def __init__(self):
         self.db_manager = DatabaseManager()
         self.notification_service = NotificationService()
+        self.dispatcher = AsyncDispatcher(self.notification_service, on_defer=self._defer)
+        self.scheduler = ReminderScheduler(self.db_manager)
+        self.worker_id = Config.WORKER_ID or f"{socket.gethostname()}:{os.getpid()}"
+        self.pending_acknowledgements = []
+        self.maintenance = schedule.Scheduler()
+        self._stop_event = threading.Event()
+        # Профилирование ближайших тиков (PROFILE_TICKS или сигнал SIGUSR1)
+        self._profile_ticks = Config.PROFILE_TICKS
+        self._profiler = None
+        # Ожидание по лимитам скорости в текущем тике (режим sync)
+        self._rate_limit_waited = 0.0
         self.setup_logging()
         
     def setup_logging(self):
-        """Настройка логирования"""
-        logging.basicConfig(
-            level=getattr(logging, Config.LOG_LEVEL),
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('reminder_bot.log'),
-                logging.StreamHandler()
-            ]
-        )
+        """Настройка логирования (запись в файл и консоль в фоновом потоке)"""
+        configure_logging()
         self.logger = logging.getLogger(__name__)
         
     def initialize_database(self):
@@ -42,90 +59,349 @@ class ReminderBot:
             raise
     
     def check_and_send_reminders(self):
-        """Проверка и отправка напоминаний"""
-        try:
-            pending_reminders = self.db_manager.get_pending_reminders()
-            
-            if not pending_reminders:
-                self.logger.debug("Нет ожидающих напоминаний")
+        """Проверка и отправка напоминаний, возвращает число обработанных
+
+        Все обращения к базе за тик идут через одно соединение (unit_of_work).
+        """
+        processed = 0
+        self._rate_limit_waited = 0.0
+        with self.db_manager.unit_of_work():
+            try:
+                for batch in self._iter_due_batches():
+                    self.logger.debug("Получена пачка из %d ожидающих напоминаний", len(batch))
+                    processed += len(batch)
+                    batch = self._handle_stale(batch)
+                    if batch:
+                        self._dispatch(batch)
+                    
+                    # Статусы пишутся после каждой пачки: память тика не растет с очередью,
+                    # сбой посреди тика не приводит к повторной отправке уже доставленных,
+                    # а захваченные напоминания подтверждаются до истечения аренды
+                    self._flush_acknowledgements()
+                
+                if not processed:
+                    self.logger.debug("Нет ожидающих напоминаний")
+                else:
+                    self.logger.info(f"Обработано {processed} ожидающих напоминаний")
+                        
+            except Exception as e:
+                self.logger.error(f"Ошибка проверки напоминаний: {e}")
+            finally:
+                self._flush_acknowledgements()
+        return processed
+    
+    def _dispatch(self, batch):
+        """Отправка пачки в настроенном режиме: дайджесты, async или по одному"""
+        if Config.DIGEST_MODE:
+            self._dispatch_digests(batch)
+        elif Config.DISPATCH_MODE == 'async':
+            self._dispatch_batch_async(batch)
+        else:
+            for reminder, user in batch:
+                self._process_reminder(reminder, user)
+    
+    def _iter_due_batches(self):
+        """Пачки напоминаний для отправки в текущем тике
+
+        В режиме нескольких воркеров пачки захватываются в аренду, чтобы
+        одно напоминание не отправили два процесса.
+        """
+        if Config.CATCHUP_THRESHOLD:
+            yield from self._iter_prioritized_batches()
+            return
+        
+        if not Config.MULTI_WORKER:
+            yield from self.db_manager.iter_due_reminders()
+            return
+        
+        while True:
+            batch = self.db_manager.claim_due_reminders(self.worker_id)
+            if not batch:
                 return
+            yield batch
+    
+    def _iter_prioritized_batches(self):
+        """Пачки тика в догоняющем режиме: сначала текущие напоминания, затем бэклог
+
+        Бэклог - напоминания со сроком раньше начала тика минус CATCHUP_THRESHOLD.
+        В каждом круге сначала отправляется пачка текущих напоминаний, включая
+        наступившие за время тика, затем пачка бэклога размером в долю
+        CATCHUP_SHARE. Если текущих нет, бэклог получает всю пачку. Так разбор
+        очереди после простоя не задерживает напоминания, срок которых наступает сейчас.
+        """
+        batch_size = Config.FETCH_BATCH_SIZE
+        backlog_share = max(1, int(batch_size * Config.CATCHUP_SHARE))
+        cutoff = datetime.utcnow() - timedelta(seconds=Config.CATCHUP_THRESHOLD)
+        current_after = backlog_after = None
+        backlog_pending = True
+        
+        while True:
+            current_limit = max(1, batch_size - backlog_share) if backlog_pending else batch_size
+            current = self._fetch_lane(current_limit, current_after, since=cutoff)
+            if current:
+                current_after = (current[-1][0].reminder_time, current[-1][0].id)
+                CATCHUP_BATCHES.inc(lane='current')
+                yield current
             
-            self.logger.info(f"Найдено {len(pending_reminders)} ожидающих напоминаний")
+            if not backlog_pending:
+                if len(current) < current_limit:
+                    return
+                continue
             
-            for reminder in pending_reminders:
-                try:
-                    user = self.db_manager.get_user_by_id(reminder.user_id)
-                    if not user:
-                        self.logger.error(f"Пользователь с ID {reminder.user_id} не найден")
-                        continue
-                    
-                    # Отправка уведомления
-                    success = self.notification_service.send_notification(user, reminder)
-                    
-                    if success:
-                        # Обновление статуса на "отправлено"
-                        self.db_manager.update_reminder_status(
-                            reminder.id, 
-                            ReminderStatus.SENT, 
-                            datetime.utcnow()
-                        )
-                        
-                        # Если напоминание повторяющееся, создаем следующее
-                        if reminder.is_recurring:
-                            self._create_next_recurring_reminder(reminder)
-                            
-                    else:
-                        # Обновление статуса на "ошибка"
-                        self.db_manager.update_reminder_status(
-                            reminder.id, 
-                            ReminderStatus.FAILED
-                        )
-                        
-                except Exception as e:
-                    self.logger.error(f"Ошибка обработки напоминания {reminder.id}: {e}")
-                    
-        except Exception as e:
-            self.logger.error(f"Ошибка проверки напоминаний: {e}")
+            backlog_limit = backlog_share if current else batch_size
+            backlog = self._fetch_lane(backlog_limit, backlog_after, until=cutoff)
+            backlog_pending = len(backlog) == backlog_limit
+            if backlog:
+                backlog_after = (backlog[-1][0].reminder_time, backlog[-1][0].id)
+                CATCHUP_BATCHES.inc(lane='backlog')
+                yield backlog
+            elif not current:
+                return
     
-    def _create_next_recurring_reminder(self, reminder):
-        """Создание следующего повторяющегося напоминания"""
+    def _fetch_lane(self, limit, after, since=None, until=None):
+        """Следующая пачка очереди догоняющего режима (since < reminder_time <= until)
+
+        Один воркер читает очередь keyset-пагинацией от after; несколько
+        воркеров захватывают пачки в аренду, и after не нужен.
+        """
+        if Config.MULTI_WORKER:
+            return self.db_manager.claim_due_reminders(self.worker_id, batch_size=limit, since=since, until=until)
+        return self.db_manager.fetch_due_batch(limit, after=after, since=since, until=until)
+    
+    def _handle_stale(self, batch):
+        """Обработка устаревших напоминаний пачки по STALE_POLICY
+
+        Напоминания, просроченные больше чем на STALE_AFTER секунд, помечаются
+        EXPIRED без отправки (expire) или отправляются одной сводкой на
+        пользователя и канал (collapse). Возвращает остальные напоминания пачки.
+        """
+        if not Config.STALE_AFTER:
+            return batch
+        
+        stale_before = datetime.utcnow() - timedelta(seconds=Config.STALE_AFTER)
+        stale = [(reminder, user) for reminder, user in batch if reminder.reminder_time < stale_before]
+        if not stale:
+            return batch
+        
+        if Config.STALE_POLICY == 'collapse':
+            self._dispatch_digests(stale, window_seconds=float('inf'))
+        else:
+            for reminder, user in stale:
+                self._expire(reminder)
+        self.logger.info("Устаревших напоминаний в пачке: %d (%s)", len(stale), Config.STALE_POLICY)
+        return [(reminder, user) for reminder, user in batch if reminder.reminder_time >= stale_before]
+    
+    def _expire(self, reminder):
+        """Пропуск устаревшего напоминания без отправки
+
+        Повторяющееся напоминание переносится на следующее повторение, а
+        пропуск записывается в журнал доставок со статусом EXPIRED.
+        """
+        REMINDERS_EXPIRED.inc(method=reminder.notification_method.value)
+        if reminder.is_recurring:
+            acknowledgement = self._next_recurring_acknowledgement(reminder, ReminderStatus.EXPIRED, None)
+            if acknowledgement:
+                self.pending_acknowledgements.append(acknowledgement)
+                return
+        self.pending_acknowledgements.append(Acknowledgement(reminder.id, ReminderStatus.EXPIRED, None))
+    
+    def _process_reminder(self, reminder, user):
+        """Отправка одного напоминания и запись результата для массового обновления"""
         try:
-            next_time = self._calculate_next_reminder_time(
-                reminder.reminder_time, 
-                reminder.recurring_interval
-            )
+            if not user:
+                self.logger.error(f"Пользователь с ID {reminder.user_id} не найден")
+                return
             
-            if next_time:
-                self.db_manager.add_reminder(
-                    user_id=reminder.user_id,
-                    title=reminder.title,
-                    message=reminder.message,
-                    reminder_time=next_time,
-                    notification_method=reminder.notification_method,
-                    is_recurring=True,
-                    recurring_interval=reminder.recurring_interval
-                )
-                self.logger.info(f"Создано следующее повторяющееся напоминание на {next_time}")
+            # Отправка уведомления
+            success = self._send_within_rate_limit(user, [reminder])
+            if success is not None:
+                self._record_outcome(reminder, success)
                 
         except Exception as e:
-            self.logger.error(f"Ошибка создания повторяющегося напоминания: {e}")
-    
-    def _calculate_next_reminder_time(self, current_time, interval):
-        """Вычисление времени следующего напоминания"""
-        if interval == "daily":
-            return current_time + timedelta(days=1)
-        elif interval == "weekly":
-            return current_time + timedelta(weeks=1)
-        elif interval == "monthly":
-            return current_time + timedelta(days=30)  # Упрощенно
+            self.logger.error(f"Ошибка обработки напоминания {reminder.id}: {e}")
+    
+    def _deliverable(self, batch):
+        """Пары (reminder, user) пачки, для которых найден пользователь"""
+        deliverable = []
+        for reminder, user in batch:
+            if not user:
+                self.logger.error(f"Пользователь с ID {reminder.user_id} не найден")
+                continue
+            deliverable.append((reminder, user))
+        return deliverable
+    
+    def _dispatch_batch_async(self, batch):
+        """Параллельная отправка пачки напоминаний через AsyncDispatcher"""
+        deliverable = self._deliverable(batch)
+        results = self.notification_service.run_coroutine(self.dispatcher.dispatch(deliverable))
+        for reminder, success in results:
+            if success is None:
+                continue
+            try:
+                self._record_outcome(reminder, success)
+            except Exception as e:
+                self.logger.error(f"Ошибка обработки напоминания {reminder.id}: {e}")
+    
+    def _dispatch_digests(self, batch, window_seconds=None):
+        """Отправка пачки дайджестами: одно сообщение на пользователя и канал
+
+        Результат отправки дайджеста записывается для всех его напоминаний
+        и подтверждается вместе с остальными статусами тика.
+        """
+        if window_seconds is None:
+            window_seconds = Config.DIGEST_WINDOW
+        digests = group_for_digest(self._deliverable(batch), window_seconds, Config.DIGEST_MAX_ITEMS)
+        if Config.DISPATCH_MODE == 'async':
+            results = self.notification_service.run_coroutine(self.dispatcher.dispatch_digests(digests))
+        else:
+            results = [
+                (reminders, self._send_within_rate_limit(user, reminders))
+                for user, reminders in digests
+            ]
+        
+        for reminders, success in results:
+            if success is None:
+                continue
+            DIGEST_SIZE.observe(len(reminders))
+            for reminder in reminders:
+                try:
+                    self._record_outcome(reminder, success)
+                except Exception as e:
+                    self.logger.error(f"Ошибка обработки напоминания {reminder.id}: {e}")
+    
+    def _send_within_rate_limit(self, user, reminders):
+        """Синхронная отправка с ожиданием очереди канала в пределах бюджета тика
+
+        За тик ожидание по лимитам в сумме не превышает RATE_LIMIT_MAX_WAIT.
+        Сверх бюджета тик не засыпает (это задержало бы всех остальных
+        пользователей и продлило аренду захваченной пачки): напоминания
+        откладываются до своего места в очереди, возвращается None. Так же
+        откладываются напоминания, для которых канал просит долгую паузу.
+        """
+        max_wait = max(0.0, Config.RATE_LIMIT_MAX_WAIT - self._rate_limit_waited)
+        delay = self.notification_service.reserve_slot(user, reminders, max_wait)
+        if delay > max_wait:
+            self._defer(reminders, delay)
+            return None
+        self._rate_limit_waited += delay
+        try:
+            return self.notification_service.send_reminders(user, reminders, delay=delay)
+        except SendDeferred as e:
+            self._defer(reminders, e.delay)
+            return None
+    
+    def _defer(self, reminders, delay):
+        """Перенос напоминаний на delay секунд без учета попытки"""
+        next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        for reminder in reminders:
+            REMINDERS_DEFERRED.inc(method=reminder.notification_method.value)
+            self.pending_acknowledgements.append(Acknowledgement(
+                reminder.id, ReminderStatus.PENDING, None,
+                attempts=reminder.attempts or 0,
+                next_attempt_at=next_attempt_at
+            ))
+    
+    def _record_outcome(self, reminder, success):
+        """Запись результата отправки для массового обновления статусов"""
+        method = reminder.notification_method.value
+        
+        # Неудачная попытка откладывается, пока не исчерпан лимит попыток
+        if not success:
+            acknowledgement = self._retry_acknowledgement(reminder)
+            if acknowledgement:
+                REMINDERS_RETRIED.inc(method=method)
+                self.pending_acknowledgements.append(acknowledgement)
+                return
+        
+        status = ReminderStatus.SENT if success else ReminderStatus.FAILED
+        sent_at = datetime.utcnow() if success else None
+        
+        if success:
+            REMINDERS_SENT.inc(method=method)
+            DISPATCH_LAG_SECONDS.observe(max((sent_at - reminder.reminder_time).total_seconds(), 0))
         else:
-            self.logger.warning(f"Неизвестный интервал повторения: {interval}")
+            REMINDERS_FAILED.inc(method=method)
+        
+        # Повторяющееся напоминание переносится на следующее повторение
+        if reminder.is_recurring:
+            acknowledgement = self._next_recurring_acknowledgement(reminder, status, sent_at)
+            if acknowledgement:
+                self.pending_acknowledgements.append(acknowledgement)
+                return
+        
+        # Статус будет записан после обработки пачки
+        self.pending_acknowledgements.append(Acknowledgement(reminder.id, status, sent_at))
+    
+    def _retry_acknowledgement(self, reminder):
+        """Перенос неудачной попытки на потом с экспоненциальной задержкой
+
+        Возвращает None, если попытки исчерпаны и напоминание считается
+        неотправленным.
+        """
+        attempts = (reminder.attempts or 0) + 1
+        fields = {'reminder_id': reminder.id, 'channel': reminder.notification_method.value, 'attempt': attempts}
+        if attempts >= Config.RETRY_MAX_ATTEMPTS:
+            self.logger.error("Напоминание %s не отправлено после %d попыток", reminder.id, attempts, extra=fields)
             return None
+        
+        delay = backoff_delay(attempts, Config.RETRY_BASE_DELAY, Config.RETRY_MAX_DELAY)
+        next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        self.logger.warning(
+            "Напоминание %s не отправлено (попытка %d), повтор в %s",
+            reminder.id, attempts, next_attempt_at, extra=fields
+        )
+        return Acknowledgement(
+            reminder.id, ReminderStatus.PENDING, None,
+            attempts=attempts,
+            next_attempt_at=next_attempt_at
+        )
     
-    def add_user(self, name, email=None, telegram_id=None):
+    def _next_recurring_acknowledgement(self, reminder, status, sent_at):
+        """Результат отправки повторяющегося напоминания с временем следующего повторения"""
+        # Без точки отсчета (строка старой версии) номер повторения к reminder_time не относится
+        anchored = reminder.recurrence_anchor is not None
+        try:
+            next_time, occurrence = next_occurrence(
+                reminder.recurrence_anchor if anchored else reminder.reminder_time,
+                reminder.recurring_interval,
+                reminder.recurrence_step,
+                reminder.recurrence_count if anchored else 0,
+                after=max(reminder.reminder_time, datetime.utcnow())
+            )
+        except (ValueError, OverflowError) as e:
+            self.logger.warning(str(e))
+            return None
+        
+        return Acknowledgement(
+            reminder.id, status, sent_at,
+            scheduled_for=reminder.reminder_time,
+            next_time=next_time,
+            occurrence=occurrence
+        )
+    
+    def _flush_acknowledgements(self):
+        """Запись накопленных статусов напоминаний одной транзакцией"""
+        if not self.pending_acknowledgements:
+            return
+        
+        acknowledgements, self.pending_acknowledgements = self.pending_acknowledgements, []
+        try:
+            updated = self.db_manager.acknowledge_reminders(acknowledgements)
+            self.logger.debug("Обновлены статусы %d напоминаний", updated)
+        except Exception as e:
+            self.logger.error(f"Ошибка обновления статусов {len(acknowledgements)} напоминаний: {e}")
+            return
+        
+        for acknowledgement in acknowledgements:
+            if acknowledgement.next_attempt_at is not None:
+                self.scheduler.notify(acknowledgement.next_attempt_at)
+            elif acknowledgement.next_time is not None:
+                self.scheduler.notify(acknowledgement.next_time)
+    
+    def add_user(self, name, email=None, telegram_id=None, webhook_url=None, locale=None):
         """Добавление нового пользователя"""
         try:
-            user_id = self.db_manager.add_user(name, email, telegram_id)
+            user_id = self.db_manager.add_user(name, email, telegram_id, webhook_url, locale)
             self.logger.info(f"Добавлен пользователь {name} с ID {user_id}")
             return user_id
         except Exception as e:
@@ -134,13 +410,14 @@ class ReminderBot:
     
     def add_reminder(self, user_id, title, message, reminder_time, 
                     notification_method=NotificationMethod.CONSOLE,
-                    is_recurring=False, recurring_interval=None):
+                    is_recurring=False, recurring_interval=None, recurrence_step=1):
         """Добавление нового напоминания"""
         try:
             reminder_id = self.db_manager.add_reminder(
                 user_id, title, message, reminder_time,
-                notification_method, is_recurring, recurring_interval
+                notification_method, is_recurring, recurring_interval, recurrence_step
             )
+            self.scheduler.notify(reminder_time)
             self.logger.info(f"Добавлено напоминание '{title}' с ID {reminder_id}")
             return reminder_id
         except Exception as e:
@@ -154,20 +431,130 @@ class ReminderBot:
         # Инициализация базы данных
         self.initialize_database()
         
-        # Настройка расписания проверки напоминаний
-        schedule.every(Config.CHECK_INTERVAL).seconds.do(self.check_and_send_reminders)
+        metrics_server = self.start_metrics_server()
+        ingest_server = self.start_ingest_server()
+        self._install_profile_signal()
+        
+        # Фоновые задачи обслуживания; напоминания отправляет планировщик
+        self.maintenance.every(Config.SMTP_IDLE_TIMEOUT).seconds.do(
+            self.notification_service.close_idle_connections
+        )
+        if Config.ARCHIVE_INTERVAL:
+            self.maintenance.every(Config.ARCHIVE_INTERVAL).seconds.do(self.archive_processed)
         
-        self.logger.info(f"Бот запущен. Интервал проверки: {Config.CHECK_INTERVAL} секунд")
+        self.logger.info(f"Бот запущен. Интервал сверки с базой: {Config.CHECK_INTERVAL} секунд")
         
         try:
-            while True:
-                schedule.run_pending()
-                time.sleep(1)
+            while not self._stop_event.is_set():
+                if self.scheduler.needs_resync():
+                    self.scheduler.resync()
+                
+                # Сон до ближайшего напоминания, сверки с базой или задачи обслуживания
+                if self.scheduler.wait(max_wait=self.maintenance.idle_seconds):
+                    if self._stop_event.is_set():
+                        break
+                    tick_started = datetime.utcnow()
+                    self._run_tick()
+                    self.scheduler.discard_due(tick_started)
+                
+                self.maintenance.run_pending()
+            self.logger.info("Бот остановлен")
         except KeyboardInterrupt:
             self.logger.info("Получен сигнал остановки. Завершение работы...")
         except Exception as e:
             self.logger.error(f"Критическая ошибка: {e}")
             raise
+        finally:
+            if metrics_server:
+                metrics_server.stop()
+            if ingest_server:
+                ingest_server.stop()
+            self.notification_service.close()
+    
+    def _run_tick(self):
+        """Тик отправки, под профилировщиком, если профилирование запрошено"""
+        if not self._profile_ticks:
+            self.check_and_send_reminders()
+            return
+        
+        from profiler import TickProfiler
+        
+        if self._profiler is None:
+            self._profiler = TickProfiler(self, memory=Config.PROFILE_MEMORY)
+        self._profiler.run()
+        self._profile_ticks -= 1
+        
+        if not self._profile_ticks:
+            profiler, self._profiler = self._profiler, None
+            self.logger.info("Профиль тиков отправки:\n%s", profiler.format_report())
+            if Config.PROFILE_OUTPUT:
+                profiler.dump(Config.PROFILE_OUTPUT)
+                self.logger.info(f"Профиль сохранен в {Config.PROFILE_OUTPUT}")
+    
+    def profile_next_ticks(self, ticks=None):
+        """Запрос профилирования следующих ticks тиков (по умолчанию PROFILE_TICKS или 1)"""
+        self._profile_ticks = ticks or Config.PROFILE_TICKS or 1
+    
+    def _install_profile_signal(self):
+        """SIGUSR1 включает профилирование следующих тиков работающего бота"""
+        import signal
+        
+        if not hasattr(signal, 'SIGUSR1') or threading.current_thread() is not threading.main_thread():
+            return
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.profile_next_ticks())
+    
+    def archive_processed(self):
+        """Фоновая архивация обработанных напоминаний
+
+        Архивация уступает отправке: между пачками проверяется, не наступил
+        ли срок следующего напоминания, и оставшееся переносится при следующем запуске.
+        """
+        from archiver import Archiver
+        
+        def should_stop():
+            next_due = self.scheduler.next_due_time()
+            return self._stop_event.is_set() or (next_due is not None and next_due <= datetime.utcnow())
+        
+        try:
+            Archiver(self.db_manager, export_path=Config.ARCHIVE_EXPORT_PATH or None).run(should_stop=should_stop)
+        except Exception as e:
+            self.logger.error(f"Ошибка архивации напоминаний: {e}")
+    
+    def start_metrics_server(self):
+        """Запуск HTTP endpoint метрик, если задан METRICS_PORT"""
+        if not Config.METRICS_PORT:
+            return None
+        try:
+            # Размер очереди считается при каждом чтении метрик
+            BACKLOG.set_function(self.db_manager.count_due_reminders)
+            return MetricsServer(Config.METRICS_HOST, Config.METRICS_PORT).start()
+        except OSError as e:
+            self.logger.error(f"Не удалось запустить сервер метрик: {e}")
+            return None
+    
+    def start_ingest_server(self):
+        """Запуск HTTP приема напоминаний, если задан INGEST_PORT
+
+        Сроки принятых напоминаний сразу попадают в планировщик.
+        """
+        if not Config.INGEST_PORT:
+            return None
+        from ingest_server import IngestServer
+        
+        def on_commit(reminder_times):
+            for reminder_time in reminder_times:
+                self.scheduler.notify(reminder_time)
+        
+        try:
+            return IngestServer(Config.INGEST_HOST, Config.INGEST_PORT, self.db_manager, on_commit=on_commit).start()
+        except OSError as e:
+            self.logger.error(f"Не удалось запустить прием напоминаний: {e}")
+            return None
+    
+    def stop(self):
+        """Остановка цикла run из другого потока"""
+        self._stop_event.set()
+        self.scheduler.wake()
 
 def demo_usage():
     """Демонстрация использования бота"""
@@ -191,7 +578,7 @@ def demo_usage():
         )
         
         print("Добавлено тестовое напоминание на", reminder_time.strftime('%H:%M:%S'))
-        print("Бот будет проверять напоминания каждые", Config.CHECK_INTERVAL, "секунд")
+        print("Бот отправит его в срок; сверка с базой каждые", Config.CHECK_INTERVAL, "секунд")
 
 if __name__ == "__main__":
     import sys
@@ -0,0 +1,236 @@
+"""
+Метрики бота в текстовом формате Prometheus
+
+Счетчики, gauge и гистограммы хранятся в памяти процесса и отдаются
+встроенным HTTP сервером по адресу /metrics.
+"""
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """Базовый класс метрики с метками"""
+
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """Значение, которое может расти и уменьшаться"""
+
+    metric_type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function):
+        """Вычисление значения (без меток) в момент чтения метрик"""
+        self._function = function
+
+    def render(self):
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Ошибка вычисления метрики {self.name}: {e}")
+        return super().render()
+
+class Histogram(_Metric):
+    """Гистограмма распределения значений по корзинам"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Замер длительности блока кода"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_sample(self, key, value):
+        bucket_counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, bucket_counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Registry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+DISPATCH_LAG_SECONDS = Histogram(
+    'reminder_dispatch_lag_seconds',
+    'Задержка от reminder_time до отправки напоминания',
+    buckets=LAG_BUCKETS
+)
+SEND_SECONDS = Histogram(
+    'reminder_send_seconds',
+    'Длительность отправки уведомления по каналам',
+    ['method']
+)
+DB_QUERY_SECONDS = Histogram(
+    'reminder_db_query_seconds',
+    'Длительность операций с базой данных',
+    ['operation']
+)
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    'reminder_rate_limit_wait_seconds',
+    'Ожидание в очереди по лимиту скорости канала',
+    ['method'],
+    buckets=LAG_BUCKETS
+)
+DIGEST_SIZE = Histogram(
+    'reminder_digest_size',
+    'Число напоминаний в одном сообщении в режиме дайджеста',
+    buckets=(1, 2, 5, 10, 20, 50, 100)
+)
+REMINDERS_SENT = Counter('reminders_sent_total', 'Отправленные напоминания', ['method'])
+REMINDERS_FAILED = Counter('reminders_failed_total', 'Напоминания, которые не удалось отправить', ['method'])
+REMINDERS_RETRIED = Counter('reminders_retried_total', 'Повторные попытки отправки', ['method'])
+REMINDERS_DEFERRED = Counter('reminders_deferred_total', 'Напоминания, отложенные до своей очереди по лимиту скорости', ['method'])
+REMINDERS_EXPIRED = Counter('reminders_expired_total', 'Устаревшие напоминания, пропущенные без отправки', ['method'])
+CATCHUP_BATCHES = Counter('reminder_catchup_batches_total', 'Пачки отправки по очередям догоняющего режима', ['lane'])
+INGEST_COMMIT_SIZE = Histogram(
+    'reminder_ingest_commit_size',
+    'Число напоминаний в одной транзакции приема',
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+BACKLOG = Gauge('reminder_backlog', 'Ожидающие напоминания, срок которых наступил')
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        payload = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+class MetricsServer(ThreadingHTTPServer):
+    """HTTP сервер метрик, работающий в фоновом потоке"""
+
+    daemon_threads = True
+
+    def __init__(self, host, port, registry=None):
+        super().__init__((host, port), _MetricsHandler)
+        self.registry = registry or REGISTRY
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='metrics', daemon=True)
+        self._thread.start()
+        logging.getLogger(__name__).info(
+            f"Метрики доступны на http://{self.server_address[0]}:{self.server_address[1]}/metrics"
+        )
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
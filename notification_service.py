@@ -1,123 +1,420 @@
-import smtplib
+import time
+import base64
+import asyncio
 import logging
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from telegram import Bot
-from telegram.error import TelegramError
+import smtplib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.header import Header
 from config import Config
 from database import NotificationMethod
+from smtp_pool import SMTPConnectionPool
+from rate_limiter import RateLimiter
+from channels import Channel, FunctionChannel, SendDeferred
+from webhook_channel import WebhookChannel
+from templates import TemplateRegistry
+from metrics import SEND_SECONDS, RATE_LIMIT_WAIT_SECONDS, REMINDERS_RETRIED
+
+# Коды SMTP, которыми сервер просит повторить отправку позже
+_SMTP_THROTTLE_CODES = (421, 450, 451, 452)
 
 class NotificationService:
     """Сервис для отправки уведомлений"""
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.telegram_bot = None
+        self._telegram_bot = None
+        self._loop = None
+        self._email_executor = None
+        self._smtp_pool = None
+        # Места в очереди лимита, закрепленные за отложенными напоминаниями (ID -> time.monotonic)
+        self._deferred_slots = OrderedDict()
+        self._deferred_slots_lock = threading.Lock()
+        
+        # Шаблоны сообщений компилируются при запуске
+        self.templates = TemplateRegistry(
+            directory=Config.TEMPLATES_DIR or None,
+            default_locale=Config.DEFAULT_LOCALE,
+            cache_size=Config.TEMPLATE_CACHE_SIZE
+        ).preload()
         
-        # Инициализация Telegram бота если токен предоставлен
-        if Config.TELEGRAM_BOT_TOKEN:
+        # Лимиты отправки: сообщения сверх лимита ждут своей очереди
+        self.rate_limiters = {
+            NotificationMethod.TELEGRAM: RateLimiter(
+                Config.TELEGRAM_RATE_LIMIT, per_key_rate=Config.TELEGRAM_CHAT_RATE_LIMIT
+            ),
+            NotificationMethod.EMAIL: RateLimiter(Config.SMTP_RATE_LIMIT),
+        }
+        
+        # Реестр каналов: способ отправки -> Channel
+        self.channels = {}
+        self.register_channel(NotificationMethod.EMAIL, FunctionChannel(self._send_email, self._send_email_async))
+        self.register_channel(NotificationMethod.TELEGRAM, FunctionChannel(
+            lambda user, reminders: self.run_coroutine(self._send_telegram(user, reminders)),
+            self._send_telegram
+        ))
+        self.register_channel(NotificationMethod.CONSOLE, FunctionChannel(self._send_console, self._send_console_async))
+        self.register_channel(NotificationMethod.WEBHOOK, WebhookChannel(
+            self.run_coroutine,
+            default_url=Config.WEBHOOK_URL or None,
+            timeout=Config.WEBHOOK_TIMEOUT,
+            max_connections=Config.WEBHOOK_MAX_CONNECTIONS,
+            endpoint_concurrency=Config.WEBHOOK_ENDPOINT_CONCURRENCY,
+            batch_size=Config.WEBHOOK_BATCH_SIZE,
+            batch_wait=Config.WEBHOOK_BATCH_WAIT,
+            token=Config.WEBHOOK_TOKEN or None,
+            max_retries=Config.THROTTLE_MAX_RETRIES,
+            max_wait=Config.RATE_LIMIT_MAX_WAIT
+        ))
+    
+    def register_channel(self, method, channel):
+        """Регистрация канала доставки для способа отправки"""
+        if not isinstance(channel, Channel):
+            raise TypeError(f"Канал {method} должен наследовать Channel: {channel!r}")
+        self.channels[method] = channel
+    
+    @property
+    def telegram_bot(self):
+        """Telegram бот, если токен предоставлен
+
+        python-telegram-bot импортируется и бот создается при первой отправке
+        в Telegram, поэтому запуск без Telegram не тратит на это время.
+        """
+        if self._telegram_bot is None and Config.TELEGRAM_BOT_TOKEN:
             try:
-                self.telegram_bot = Bot(token=Config.TELEGRAM_BOT_TOKEN)
+                from telegram import Bot
+                from telegram.request import HTTPXRequest
+                
+                # Пул HTTP соединений по размеру лимита параллельных отправок
+                self._telegram_bot = Bot(
+                    token=Config.TELEGRAM_BOT_TOKEN,
+                    base_url=Config.TELEGRAM_BASE_URL,
+                    request=HTTPXRequest(connection_pool_size=max(1, Config.TELEGRAM_CONCURRENCY))
+                )
             except Exception as e:
                 self.logger.error(f"Ошибка инициализации Telegram бота: {e}")
+        return self._telegram_bot
     
     def send_notification(self, user, reminder):
         """Отправка уведомления пользователю"""
+        return self.send_reminders(user, [reminder])
+    
+    async def send_notification_async(self, user, reminder, rate_limit=True):
+        """Асинхронная отправка уведомления пользователю"""
+        return await self.send_reminders_async(user, [reminder], rate_limit)
+    
+    def send_reminders(self, user, reminders, delay=None):
+        """Отправка пользователю одного или нескольких напоминаний одним сообщением
+
+        Все напоминания должны быть с одним способом отправки. Несколько
+        напоминаний объединяются в дайджест. delay - задержка по уже
+        зарезервированному месту в очереди (reserve_slot). Если канал
+        просит ждать дольше RATE_LIMIT_MAX_WAIT, бросается SendDeferred.
+        """
+        if delay is None:
+            delay = self.reserve_send_slot(user, reminders[0])
+        if delay:
+            time.sleep(delay)
+        method = reminders[0].notification_method
+        started = time.perf_counter()
+        success = False
         try:
-            if reminder.notification_method == NotificationMethod.EMAIL:
-                return self._send_email(user, reminder)
-            elif reminder.notification_method == NotificationMethod.TELEGRAM:
-                return self._send_telegram(user, reminder)
-            elif reminder.notification_method == NotificationMethod.CONSOLE:
-                return self._send_console(user, reminder)
+            channel = self.channels.get(method)
+            if channel is not None:
+                success = channel.send(user, reminders)
             else:
-                self.logger.error(f"Неизвестный метод уведомления: {reminder.notification_method}")
-                return False
+                self.logger.error(f"Неизвестный метод уведомления: {method}")
+        except SendDeferred:
+            success = None
+            raise
         except Exception as e:
             self.logger.error(f"Ошибка отправки уведомления: {e}")
-            return False
+        finally:
+            self._observe_send(user, reminders, started, success)
+        return success
+    
+    async def send_reminders_async(self, user, reminders, rate_limit=True):
+        """Асинхронная отправка одного или нескольких напоминаний одним сообщением
+
+        Telegram и webhook отправляются корутинами, а блокирующий smtplib
+        выполняется в отдельном пуле потоков, чтобы не останавливать цикл
+        событий. rate_limit=False - вызывающий уже дождался лимита
+        (wait_for_rate_limit или reserve_slot).
+        """
+        if rate_limit:
+            await self.wait_for_rate_limit(user, reminders[0])
+        method = reminders[0].notification_method
+        started = time.perf_counter()
+        success = False
+        try:
+            channel = self.channels.get(method)
+            if channel is not None:
+                success = await channel.send_async(user, reminders)
+            else:
+                self.logger.error(f"Неизвестный метод уведомления: {method}")
+        except SendDeferred:
+            success = None
+            raise
+        except Exception as e:
+            self.logger.error(f"Ошибка отправки уведомления: {e}")
+        finally:
+            self._observe_send(user, reminders, started, success)
+        return success
+    
+    def reserve_send_slot(self, user, reminder):
+        """Резервирование места в очереди канала, возвращает задержку в секундах"""
+        limiter = self.rate_limiters.get(reminder.notification_method)
+        if limiter is None:
+            return 0.0
+        key = user.telegram_id if reminder.notification_method == NotificationMethod.TELEGRAM else None
+        delay = limiter.reserve(key)
+        RATE_LIMIT_WAIT_SECONDS.observe(delay, method=reminder.notification_method.value)
+        return delay
+    
+    def reserve_slot(self, user, reminders, max_wait):
+        """Место в очереди канала с пределом ожидания, возвращает задержку
+
+        Если задержка больше max_wait, место закрепляется за
+        напоминанием: вызывающий откладывает его на это время, а при
+        следующей попытке используется то же место, а не новое в конце очереди.
+        """
+        with self._deferred_slots_lock:
+            send_at = self._deferred_slots.pop(reminders[0].id, None)
+        if send_at is not None:
+            delay = max(0.0, send_at - time.monotonic())
+        else:
+            delay = self.reserve_send_slot(user, reminders[0])
+        
+        if delay > max_wait:
+            self._hold_slot(reminders[0], delay)
+        return delay
+    
+    def _hold_slot(self, reminder, delay):
+        """Закрепление места в очереди за отложенным напоминанием"""
+        now = time.monotonic()
+        with self._deferred_slots_lock:
+            self._deferred_slots[reminder.id] = now + delay
+            # Места напоминаний, которые так и не вернулись (удалены, взяты другим воркером)
+            while self._deferred_slots and next(iter(self._deferred_slots.values())) < now - 60:
+                self._deferred_slots.popitem(last=False)
+    
+    def _throttle_delay(self, reminders, limiter, pause, key=None):
+        """Пауза по просьбе канала: приостанавливает лимит и возвращает ожидание
+
+        Если ждать нужно дольше RATE_LIMIT_MAX_WAIT, место в очереди
+        закрепляется за напоминанием и бросается SendDeferred.
+        """
+        limiter.pause(pause)
+        delay = max(pause, limiter.reserve(key))
+        if delay > Config.RATE_LIMIT_MAX_WAIT:
+            self._hold_slot(reminders[0], delay)
+            raise SendDeferred(delay)
+        return delay
+    
+    async def wait_for_rate_limit(self, user, reminder):
+        """Ожидание своей очереди по лимиту канала без блокировки цикла событий"""
+        delay = self.reserve_send_slot(user, reminder)
+        if delay:
+            await asyncio.sleep(delay)
+    
+    def _observe_send(self, user, reminders, started, success):
+        """Учет длительности отправки в метриках канала и запись результата в лог
+
+        Сообщение форматируется отложенно, в потоке записи логов.
+        """
+        latency = time.perf_counter() - started
+        method = reminders[0].notification_method
+        channel = getattr(method, 'value', method)
+        SEND_SECONDS.observe(latency, method=channel)
+        
+        fields = {
+            'reminder_id': reminders[0].id if len(reminders) == 1 else [reminder.id for reminder in reminders],
+            'channel': channel,
+            'latency': round(latency, 6),
+        }
+        if success:
+            self.logger.info("Уведомление (%d) отправлено пользователю %s через %s",
+                             len(reminders), user.name, channel, extra=fields)
+        elif success is None:
+            self.logger.info("Уведомление (%d) пользователю %s через %s отложено",
+                             len(reminders), user.name, channel, extra=fields)
+        else:
+            self.logger.warning("Уведомление (%d) не отправлено пользователю %s через %s",
+                                len(reminders), user.name, channel, extra=fields)
+    
+    def run_coroutine(self, coroutine):
+        """Выполнение корутины в собственном цикле событий сервиса
+
+        Клиент Telegram привязан к циклу событий, в котором создано его
+        соединение, поэтому все асинхронные вызовы сервиса идут через один цикл.
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coroutine)
+    
+    def _get_email_executor(self):
+        """Пул потоков для блокирующей отправки email"""
+        if self._email_executor is None:
+            self._email_executor = ThreadPoolExecutor(
+                max_workers=max(1, Config.EMAIL_CONCURRENCY),
+                thread_name_prefix='email'
+            )
+        return self._email_executor
+    
+    def _get_smtp_pool(self):
+        """Пул SMTP соединений, общий для всех писем"""
+        if self._smtp_pool is None:
+            self._smtp_pool = SMTPConnectionPool(
+                Config.SMTP_SERVER,
+                Config.SMTP_PORT,
+                username=Config.EMAIL_USER,
+                password=Config.EMAIL_PASSWORD,
+                size=Config.SMTP_POOL_SIZE,
+                idle_timeout=Config.SMTP_IDLE_TIMEOUT,
+                timeout=Config.SMTP_TIMEOUT,
+                starttls=Config.SMTP_STARTTLS
+            )
+        return self._smtp_pool
+    
+    def close_idle_connections(self):
+        """Закрытие простаивающих SMTP соединений"""
+        if self._smtp_pool is not None:
+            closed = self._smtp_pool.close_idle()
+            if closed:
+                self.logger.debug(f"Закрыто {closed} простаивающих SMTP соединений")
     
-    def _send_email(self, user, reminder):
+    def close(self):
+        """Освобождение соединений и фоновых ресурсов сервиса"""
+        for method, channel in self.channels.items():
+            try:
+                channel.close()
+            except Exception as e:
+                self.logger.error(f"Ошибка закрытия канала {method}: {e}")
+        if self._smtp_pool is not None:
+            self._smtp_pool.close()
+        if self._email_executor is not None:
+            self._email_executor.shutdown(wait=True)
+            self._email_executor = None
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
+    
+    def _send_email(self, user, reminders):
         """Отправка email уведомления"""
-        if not user.email or not Config.EMAIL_USER or not Config.EMAIL_PASSWORD:
+        if not user.email or not Config.EMAIL_USER:
             self.logger.warning("Email не настроен для отправки")
             return False
         
         try:
-            msg = MIMEMultipart()
-            msg['From'] = Config.EMAIL_USER
-            msg['To'] = user.email
-            msg['Subject'] = f"Напоминание: {reminder.title}"
-            
-            body = f"""
-            Привет, {user.name}!
-            
-            Это напоминание: {reminder.title}
+            msg = self._render_email(user, reminders)
             
-            {reminder.message if reminder.message else ''}
+            for attempt in range(Config.THROTTLE_MAX_RETRIES + 1):
+                try:
+                    self._get_smtp_pool().sendmail(Config.EMAIL_USER, [user.email], msg)
+                    break
+                except smtplib.SMTPResponseException as e:
+                    if e.smtp_code not in _SMTP_THROTTLE_CODES or attempt == Config.THROTTLE_MAX_RETRIES:
+                        raise
+                    # Сервер просит подождать: приостанавливаем всю очередь писем
+                    backoff = Config.SMTP_THROTTLE_BACKOFF * 2 ** attempt
+                    self.logger.warning(f"SMTP сервер ограничил отправку ({e.smtp_code}), пауза {backoff} с")
+                    delay = self._throttle_delay(reminders, self.rate_limiters[NotificationMethod.EMAIL], backoff)
+                    REMINDERS_RETRIED.inc(method='email')
+                    time.sleep(delay)
             
-            Время напоминания: {reminder.reminder_time}
-            """
-            
-            msg.attach(MIMEText(body, 'plain', 'utf-8'))
-            
-            server = smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT)
-            server.starttls()
-            server.login(Config.EMAIL_USER, Config.EMAIL_PASSWORD)
-            server.send_message(msg)
-            server.quit()
-            
-            self.logger.info(f"Email отправлен пользователю {user.name} ({user.email})")
             return True
             
+        except SendDeferred:
+            raise
         except Exception as e:
             self.logger.error(f"Ошибка отправки email: {e}")
             return False
     
-    def _send_telegram(self, user, reminder):
+    def _render_email(self, user, reminders):
+        """Письмо с одним напоминанием или дайджестом, готовое к отправке (bytes)
+
+        Письмо собирается из шаблона без дерева MIME: заголовки и тело в
+        base64 сразу записываются в байты, которые уходят в SMTP как есть.
+        """
+        subject, body = self.templates.render('email', user, reminders)
+        if not (subject.isascii() and subject.isprintable()):
+            # Кириллица и переводы строк из заголовка кодируются по RFC 2047
+            subject = Header(subject, 'utf-8', header_name='Subject').encode(linesep='\r\n')
+        headers = (
+            f"From: {Config.EMAIL_USER}\r\n"
+            f"To: {user.email}\r\n"
+            f"Subject: {subject}\r\n"
+            "MIME-Version: 1.0\r\n"
+            "Content-Type: text/plain; charset=\"utf-8\"\r\n"
+            "Content-Transfer-Encoding: base64\r\n\r\n"
+        )
+        return headers.encode() + base64.encodebytes(body.encode()).replace(b'\n', b'\r\n')
+    
+    async def _send_email_async(self, user, reminders):
+        """Отправка email в пуле потоков, чтобы не блокировать цикл событий"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_email_executor(), self._send_email, user, reminders)
+    
+    async def _send_telegram(self, user, reminders):
         """Отправка Telegram уведомления"""
+        from telegram.error import TelegramError, RetryAfter
+        
         if not user.telegram_id or not self.telegram_bot:
             self.logger.warning("Telegram не настроен для отправки")
             return False
         
         try:
-            message = f"""
-🔔 *Напоминание: {reminder.title}*
-
-{reminder.message if reminder.message else ''}
-
-⏰ Время: {reminder.reminder_time.strftime('%d.%m.%Y %H:%M')}
-            """
+            message = self._render_telegram(user, reminders)
             
-            self.telegram_bot.send_message(
-                chat_id=user.telegram_id,
-                text=message,
-                parse_mode='Markdown'
-            )
+            for attempt in range(Config.THROTTLE_MAX_RETRIES + 1):
+                try:
+                    await self.telegram_bot.send_message(
+                        chat_id=user.telegram_id,
+                        text=message,
+                        parse_mode='HTML'
+                    )
+                    break
+                except RetryAfter as e:
+                    if attempt == Config.THROTTLE_MAX_RETRIES:
+                        raise
+                    # Flood control Telegram: приостанавливаем остальные отправки на retry_after
+                    self.logger.warning(f"Telegram ограничил отправку, пауза {e.retry_after} с")
+                    delay = self._throttle_delay(
+                        reminders, self.rate_limiters[NotificationMethod.TELEGRAM], e.retry_after, user.telegram_id
+                    )
+                    REMINDERS_RETRIED.inc(method='telegram')
+                    await asyncio.sleep(delay)
             
-            self.logger.info(f"Telegram сообщение отправлено пользователю {user.name}")
             return True
             
         except TelegramError as e:
             self.logger.error(f"Ошибка отправки Telegram сообщения: {e}")
             return False
     
-    def _send_console(self, user, reminder):
+    def _render_telegram(self, user, reminders):
+        """Текст Telegram сообщения (HTML) с одним напоминанием или дайджестом"""
+        return self.templates.render('telegram', user, reminders)[1]
+    
+    def _send_console(self, user, reminders):
         """Вывод уведомления в консоль"""
         try:
             print(f"\n{'='*50}")
-            print(f"🔔 НАПОМИНАНИЕ")
+            print(f"🔔 НАПОМИНАНИЕ" if len(reminders) == 1 else f"🔔 НАПОМИНАНИЯ ({len(reminders)})")
             print(f"{'='*50}")
             print(f"Пользователь: {user.name}")
-            print(f"Заголовок: {reminder.title}")
-            if reminder.message:
-                print(f"Сообщение: {reminder.message}")
-            print(f"Время: {reminder.reminder_time.strftime('%d.%m.%Y %H:%M')}")
+            for reminder in reminders:
+                print(f"Заголовок: {reminder.title}")
+                if reminder.message:
+                    print(f"Сообщение: {reminder.message}")
+                print(f"Время: {reminder.reminder_time.strftime('%d.%m.%Y %H:%M')}")
             print(f"{'='*50}\n")
             
-            self.logger.info(f"Консольное уведомление для пользователя {user.name}")
             return True
             
         except Exception as e:
             self.logger.error(f"Ошибка вывода в консоль: {e}")
-            return False
\ No newline at end of file
+            return False
+    
+    async def _send_console_async(self, user, reminders):
+        return self._send_console(user, reminders)
@@ -0,0 +1,176 @@
+"""
+Профилирование тиков отправки
+
+TickProfiler выполняет тики бота под cProfile и tracemalloc и строит отчет:
+распределение времени по фазам тика, самые дорогие функции и места
+выделения памяти. Профиль можно сохранить в файл для pstats или snakeviz.
+"""
+
+import io
+import os
+import time
+import threading
+import pstats
+import cProfile
+import tracemalloc
+
+# Фазы тика в порядке отчета
+PHASES = (
+    ('fetch', 'выборка из базы'),
+    ('users', 'пользователи'),
+    ('render', 'подготовка сообщений'),
+    ('send', 'отправка'),
+    ('status', 'запись статусов'),
+    ('other', 'прочее'),
+)
+
+# Методы бота, время которых относится к фазе: (путь к объекту, метод, фаза)
+_PHASE_METHODS = (
+    ('db_manager', 'fetch_due_batch', 'fetch'),
+    ('db_manager', 'claim_due_reminders', 'fetch'),
+    ('db_manager', '_to_views', 'users'),
+    ('', '_deliverable', 'users'),
+    ('notification_service', '_render_email', 'render'),
+    ('notification_service', '_render_telegram', 'render'),
+    ('notification_service.channels.webhook', '_payload', 'render'),
+    ('', '_dispatch', 'send'),
+    ('', '_record_outcome', 'status'),
+    ('', '_flush_acknowledgements', 'status'),
+)
+
+class TickProfiler:
+    """Профиль одного или нескольких тиков check_and_send_reminders бота
+
+    Фазы считаются таймерами, которые на время тика оборачивают методы из
+    _PHASE_METHODS: накопленное время cProfile искажается, когда в том же
+    потоке работает цикл событий asyncio. Время вложенных фаз вычитается из
+    внешней. Учитывается только поток тика: в режиме async письма готовятся
+    в пуле потоков, поэтому их подготовка входит в фазу отправки.
+    memory=False отключает tracemalloc: он заметно замедляет код и искажает
+    распределение времени.
+    """
+
+    def __init__(self, bot, memory=True):
+        self.bot = bot
+        self.memory = memory
+        self.profile = cProfile.Profile()
+        self.ticks = 0
+        self.wall_seconds = 0.0
+        self._phases = {key: 0.0 for key, _ in PHASES if key != 'other'}
+        self._stack = []
+        self._thread_id = None
+        self._baseline = None
+        self._snapshot = None
+        self._peak = 0
+        self._own_tracing = False
+
+    def run(self):
+        """Выполнение одного тика бота под профилировщиком, возвращает число обработанных"""
+        if self.memory and self._baseline is None:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._own_tracing = True
+            tracemalloc.reset_peak()
+            self._baseline = tracemalloc.take_snapshot()
+
+        self._thread_id = threading.get_ident()
+        installed = self._install_timers()
+        started = time.perf_counter()
+        try:
+            return self.profile.runcall(self.bot.check_and_send_reminders)
+        finally:
+            self.wall_seconds += time.perf_counter() - started
+            for target, name in installed:
+                delattr(target, name)
+            self.ticks += 1
+            if self.memory:
+                self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+
+    def _install_timers(self):
+        """Обертки с таймерами фаз на экземплярах; возвращает (объект, метод) для снятия"""
+        installed = []
+        for path, name, phase in _PHASE_METHODS:
+            target = self._resolve(path)
+            method = getattr(target, name, None) if target is not None else None
+            if method is None or name in vars(target):
+                continue
+            setattr(target, name, self._timed(method, phase))
+            installed.append((target, name))
+        return installed
+
+    def _resolve(self, path):
+        target = self.bot
+        for part in filter(None, path.split('.')):
+            if isinstance(target, dict):
+                # Реестр каналов: ключи - значения NotificationMethod
+                target = next((value for key, value in target.items() if getattr(key, 'value', key) == part), None)
+            else:
+                target = getattr(target, part, None)
+            if target is None:
+                return None
+        return target
+
+    def _timed(self, method, phase):
+        def timed(*args, **kwargs):
+            if threading.get_ident() != self._thread_id:
+                return method(*args, **kwargs)
+            self._stack.append(0.0)
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                nested = self._stack.pop()
+                self._phases[phase] += elapsed - nested
+                if self._stack:
+                    self._stack[-1] += elapsed
+        return timed
+
+    def finish(self):
+        """Завершение профилирования: снимок памяти и остановка tracemalloc"""
+        if self.memory and self._baseline is not None and self._snapshot is None:
+            self._snapshot = tracemalloc.take_snapshot()
+            if self._own_tracing:
+                tracemalloc.stop()
+
+    def dump(self, path):
+        """Сохранение профиля cProfile в файл"""
+        self.profile.dump_stats(path)
+
+    def phase_seconds(self):
+        """Время по фазам тика в секундах"""
+        phases = dict(self._phases)
+        phases['other'] = max(0.0, self.wall_seconds - sum(phases.values()))
+        return phases
+
+    def top_allocations(self, limit=10):
+        """Места, где за время профилирования выделено больше всего памяти"""
+        if self._snapshot is None:
+            return []
+        differences = self._snapshot.compare_to(self._baseline, 'lineno')
+        return [difference for difference in differences if difference.size_diff > 0][:limit]
+
+    def format_report(self, top=15):
+        """Текстовый отчет: фазы, самые дорогие функции и выделения памяти"""
+        self.finish()
+        lines = [f"Тиков: {self.ticks}, время: {self.wall_seconds:.3f} с"]
+
+        lines.append("Фазы:")
+        phases = self.phase_seconds()
+        for key, title in PHASES:
+            share = phases[key] / self.wall_seconds * 100 if self.wall_seconds else 0.0
+            lines.append(f"  {title:22} {phases[key]:9.3f} с {share:6.1f}%")
+
+        output = io.StringIO()
+        pstats.Stats(self.profile, stream=output).strip_dirs().sort_stats('cumulative').print_stats(top)
+        lines.append(f"Функции (по накопленному времени, первые {top}):")
+        lines.extend(line for line in output.getvalue().splitlines() if line.strip()
+                     and not line.lstrip().startswith(('Ordered by', 'List reduced')))
+
+        if self.memory:
+            lines.append(f"Память: пик {self._peak // 1024} КБ")
+            for difference in self.top_allocations(top):
+                frame = difference.traceback[0]
+                lines.append(f"  {difference.size_diff // 1024:8d} КБ {difference.count_diff:8d} блоков  "
+                             f"{os.path.basename(frame.filename)}:{frame.lineno}")
+        return "\n".join(lines)
@@ -0,0 +1,77 @@
+import time
+import threading
+from collections import OrderedDict
+
+class TokenBucket:
+    """Ограничитель скорости по алгоритму token bucket
+
+    Реализован через виртуальное время (GCRA): reserve не отказывает, а
+    назначает вызывающему момент, когда для него освободится токен. Поэтому
+    сообщения сверх лимита не теряются, а встают в очередь в порядке
+    обращения. rate - токенов в секунду, capacity - допустимый всплеск.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.interval = 1.0 / rate
+        self.capacity = max(1, capacity or int(rate))
+        self._tolerance = (self.capacity - 1) * self.interval
+        self._theoretical_arrival = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, not_before=None):
+        """Резервирование токена, возвращает момент отправки (time.monotonic)"""
+        now = time.monotonic()
+        requested = max(now, not_before or now)
+        with self._lock:
+            send_at = max(requested, self._theoretical_arrival - self._tolerance)
+            self._theoretical_arrival = max(self._theoretical_arrival, send_at) + self.interval
+        return send_at
+
+    def pause(self, seconds):
+        """Запрет отправки на seconds секунд (например, по retry_after)"""
+        resume_at = time.monotonic() + seconds
+        with self._lock:
+            self._theoretical_arrival = max(self._theoretical_arrival, resume_at + self._tolerance)
+
+class KeyedTokenBuckets:
+    """Набор token bucket по ключу (например, по чату) с ограничением числа ключей"""
+
+    def __init__(self, rate, capacity=None, max_keys=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+                # Давно не использованные ключи вытесняются: их лимит уже восстановился
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket
+
+class RateLimiter:
+    """Общий лимит канала и, при необходимости, лимит на получателя"""
+
+    def __init__(self, rate=0, per_key_rate=0, per_key_capacity=None):
+        self.bucket = TokenBucket(rate) if rate > 0 else None
+        self.per_key = KeyedTokenBuckets(per_key_rate, per_key_capacity) if per_key_rate > 0 else None
+
+    def reserve(self, key=None):
+        """Резервирование отправки, возвращает задержку в секундах"""
+        send_at = time.monotonic()
+        if self.per_key is not None and key is not None:
+            send_at = self.per_key.get(key).reserve(send_at)
+        if self.bucket is not None:
+            send_at = self.bucket.reserve(send_at)
+        return max(0.0, send_at - time.monotonic())
+
+    def pause(self, seconds):
+        """Приостановка всех отправок канала"""
+        if self.bucket is not None:
+            self.bucket.pause(seconds)
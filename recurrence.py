@@ -0,0 +1,68 @@
+import calendar
+from datetime import timedelta
+
+# Поддерживаемые интервалы повторения
+INTERVALS = ('daily', 'weekly', 'monthly')
+
+def add_months(value, months):
+    """Сдвиг даты на целое число месяцев с учетом длины месяца
+
+    Если в целевом месяце нет такого дня, берется последний день месяца:
+    31 января + 1 месяц = 28 (29) февраля.
+    """
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+def occurrence_time(anchor, interval, step, index):
+    """Время повторения с номером index, отсчитанного от anchor
+
+    Время всегда считается от исходной точки, а не от предыдущего
+    повторения, поэтому ежемесячное напоминание на 31-е число после
+    короткого месяца возвращается на 31-е.
+    """
+    step = step or 1
+    if interval == 'daily':
+        return anchor + timedelta(days=step * index)
+    elif interval == 'weekly':
+        return anchor + timedelta(weeks=step * index)
+    elif interval == 'monthly':
+        return add_months(anchor, step * index)
+    raise ValueError(f"Неизвестный интервал повторения: {interval}")
+
+def next_occurrence(anchor, interval, step, index, after):
+    """Ближайшее повторение после index со временем строго позже after
+
+    Пропущенные повторения (например, после простоя бота) не догоняются:
+    номер сразу перескакивает к первому будущему повторению.
+    Возвращает пару (время, номер повторения).
+
+    Номер index относится к anchor: после простоя в 473 дня ежедневная
+    серия переходит на следующий день, а не на 473 дня вперед.
+
+    >>> from datetime import datetime
+    >>> anchor = datetime(2025, 7, 2, 3, 0)
+    >>> next_occurrence(anchor, 'daily', 1, 0, after=datetime(2026, 10, 17, 12, 0))
+    (datetime.datetime(2026, 10, 18, 3, 0), 473)
+    >>> next_occurrence(anchor, 'daily', 1, 473, after=datetime(2026, 10, 18, 3, 0))
+    (datetime.datetime(2026, 10, 19, 3, 0), 474)
+    >>> next_occurrence(datetime(2026, 1, 31), 'monthly', 1, 1, after=datetime(2026, 2, 28))
+    (datetime.datetime(2026, 3, 31, 0, 0), 2)
+    """
+    step = step or 1
+    index = (index or 0) + 1
+
+    if interval in ('daily', 'weekly') and after >= anchor:
+        period = timedelta(days=step) if interval == 'daily' else timedelta(weeks=step)
+        index = max(index, (after - anchor) // period + 1)
+    elif interval == 'monthly' and after >= anchor:
+        months = (after.year - anchor.year) * 12 + after.month - anchor.month
+        index = max(index, months // step)
+
+    next_time = occurrence_time(anchor, interval, step, index)
+    while next_time <= after:
+        index += 1
+        next_time = occurrence_time(anchor, interval, step, index)
+    return next_time, index
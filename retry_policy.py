@@ -0,0 +1,11 @@
+import random
+
+def backoff_delay(attempt, base_delay, max_delay, rng=random):
+    """Задержка перед повторной попыткой номер attempt (с 1), в секундах
+
+    Задержка растет экспоненциально (base_delay, 2 * base_delay, ...) до
+    max_delay. Половина задержки случайна, чтобы напоминания, не
+    отправленные из-за одного сбоя, не возвращались одновременно.
+    """
+    delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+    return delay / 2 + rng.uniform(0, delay / 2)
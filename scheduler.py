@@ -0,0 +1,110 @@
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from config import Config
+
+class ReminderScheduler:
+    """Планировщик, ожидающий ближайшего срока напоминания
+
+    Хранит в куче сроки ожидающих напоминаний на горизонте resync_interval
+    секунд и спит ровно до ближайшего из них. Новые напоминания, добавленные
+    в этом процессе, попадают в кучу через notify и будят ожидание, если
+    их срок раньше текущего. С базой данных планировщик сверяется только
+    раз в resync_interval секунд, чтобы подхватить изменения от других процессов.
+    """
+
+    def __init__(self, db_manager, resync_interval=None, max_entries=1000):
+        self.logger = logging.getLogger(__name__)
+        self.db_manager = db_manager
+        self.resync_interval = resync_interval or Config.CHECK_INTERVAL
+        self.max_entries = max_entries
+        self._heap = []
+        self._horizon = None
+        self._complete = False
+        self._next_resync = 0.0
+        self._interrupted = False
+        self._condition = threading.Condition()
+
+    def resync(self):
+        """Загрузка ближайших сроков напоминаний из базы данных"""
+        horizon = datetime.utcnow() + timedelta(seconds=self.resync_interval)
+        try:
+            times = self.db_manager.get_upcoming_reminder_times(horizon, self.max_entries)
+        except Exception as e:
+            # Известные сроки сохраняются, повторная сверка через resync_interval
+            self.logger.error(f"Ошибка синхронизации планировщика: {e}")
+            with self._condition:
+                self._complete = True
+                self._next_resync = time.monotonic() + self.resync_interval
+            return
+        with self._condition:
+            self._heap = list(times)
+            heapq.heapify(self._heap)
+            # Если выборка обрезана лимитом, дальше последнего срока кучи ничего не известно
+            self._complete = len(times) < self.max_entries
+            self._horizon = horizon if self._complete else times[-1]
+            self._next_resync = time.monotonic() + self.resync_interval
+            self._condition.notify_all()
+        self.logger.debug(f"Планировщик синхронизирован: {len(times)} сроков до {self._horizon}")
+
+    def needs_resync(self):
+        """Пора ли сверить планировщик с базой данных"""
+        with self._condition:
+            return (time.monotonic() >= self._next_resync
+                    or (not self._heap and not self._complete))
+
+    def notify(self, reminder_time):
+        """Учет нового напоминания, добавленного в этом процессе"""
+        with self._condition:
+            if self._horizon is not None and reminder_time > self._horizon:
+                return
+            heapq.heappush(self._heap, reminder_time)
+            if self._heap[0] == reminder_time:
+                self._condition.notify_all()
+
+    def wake(self):
+        """Прерывание текущего ожидания"""
+        with self._condition:
+            self._interrupted = True
+            self._condition.notify_all()
+
+    def next_due_time(self):
+        """Ближайший известный срок напоминания или None"""
+        with self._condition:
+            return self._heap[0] if self._heap else None
+
+    def wait(self, max_wait=None):
+        """Ожидание ближайшего срока напоминания
+
+        Возвращает True, если есть напоминания, срок которых наступил, и False,
+        если ожидание прервано по max_wait, через wake или пора сверяться с базой.
+        """
+        deadline = time.monotonic() + max_wait if max_wait is not None else None
+        with self._condition:
+            while True:
+                if self._heap and self._heap[0] <= datetime.utcnow():
+                    return True
+                if self._interrupted:
+                    self._interrupted = False
+                    return False
+
+                now = time.monotonic()
+                wake_at = self._next_resync
+                if deadline is not None:
+                    wake_at = min(wake_at, deadline)
+                if now >= wake_at or (not self._heap and not self._complete):
+                    return False
+
+                timeout = wake_at - now
+                if self._heap:
+                    until_due = (self._heap[0] - datetime.utcnow()).total_seconds()
+                    timeout = min(timeout, max(until_due, 0))
+                self._condition.wait(timeout)
+
+    def discard_due(self, up_to):
+        """Удаление из кучи сроков, обработанных тиком"""
+        with self._condition:
+            while self._heap and self._heap[0] <= up_to:
+                heapq.heappop(self._heap)
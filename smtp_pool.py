@@ -0,0 +1,136 @@
+import time
+import smtplib
+import logging
+import threading
+from metrics import REMINDERS_RETRIED
+
+# Ошибки, после которых письмо отклонено, но соединение остается рабочим
+_MESSAGE_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPDataError,
+)
+
+class SMTPConnectionPool:
+    """Пул постоянных авторизованных SMTP соединений
+
+    Соединения открываются по требованию (не более size одновременно),
+    после отправки возвращаются в пул и переиспользуются следующими письмами.
+    Соединения, простоявшие дольше idle_timeout секунд, закрываются.
+    Если сервер разорвал соединение, пул переподключается и повторяет
+    отправку один раз.
+    """
+
+    def __init__(self, host, port, username=None, password=None, size=4,
+                 idle_timeout=60, timeout=30, starttls=True):
+        self.logger = logging.getLogger(__name__)
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = max(1, size)
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.starttls = starttls
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._closed = False
+
+    def _connect(self):
+        """Открытие нового соединения с STARTTLS и авторизацией"""
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                connection.starttls()
+            if self.username and self.password:
+                connection.login(self.username, self.password)
+        except Exception:
+            self._quit(connection)
+            raise
+        self.logger.debug(f"Открыто SMTP соединение с {self.host}:{self.port}")
+        return connection
+
+    def _quit(self, connection):
+        """Закрытие соединения без выброса ошибок"""
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+    def _acquire(self):
+        """Получение соединения из пула или открытие нового"""
+        self._slots.acquire()
+        try:
+            expired = []
+            connection = None
+            with self._lock:
+                while self._idle:
+                    candidate, last_used = self._idle.pop()
+                    if time.monotonic() - last_used < self.idle_timeout:
+                        connection = candidate
+                        break
+                    expired.append(candidate)
+            for stale in expired:
+                self._quit(stale)
+            return connection or self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, connection):
+        """Возврат соединения в пул"""
+        with self._lock:
+            if self._closed:
+                connection_to_close = connection
+            else:
+                self._idle.append((connection, time.monotonic()))
+                connection_to_close = None
+        if connection_to_close:
+            self._quit(connection_to_close)
+        self._slots.release()
+
+    def sendmail(self, from_addr, to_addrs, message):
+        """Отправка готового письма (bytes) через соединение из пула"""
+        connection = self._acquire()
+        try:
+            try:
+                connection.sendmail(from_addr, to_addrs, message)
+            except _MESSAGE_ERRORS:
+                raise
+            except (smtplib.SMTPServerDisconnected, OSError) as e:
+                # Сервер закрыл соединение: переподключаемся и повторяем один раз
+                self.logger.debug(f"SMTP соединение потеряно ({e}), переподключение")
+                REMINDERS_RETRIED.inc(method='email')
+                self._quit(connection)
+                connection = None
+                connection = self._connect()
+                connection.sendmail(from_addr, to_addrs, message)
+        except _MESSAGE_ERRORS:
+            self._release(connection)
+            raise
+        except Exception:
+            if connection is not None:
+                self._quit(connection)
+            self._slots.release()
+            raise
+        self._release(connection)
+
+    def close_idle(self):
+        """Закрытие соединений, простоявших дольше idle_timeout"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [conn for conn, last_used in self._idle if now - last_used >= self.idle_timeout]
+            self._idle = [(conn, last_used) for conn, last_used in self._idle
+                          if now - last_used < self.idle_timeout]
+        for connection in expired:
+            self._quit(connection)
+        return len(expired)
+
+    def close(self):
+        """Закрытие всех свободных соединений и пула"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._quit(connection)
@@ -0,0 +1,223 @@
+"""
+Шаблоны сообщений по каналам и языкам
+
+Тексты писем и сообщений Telegram задаются шаблонами str.format с полями
+name, title, message, time, count, items и number. Встроенные шаблоны
+(ru, en) можно переопределить файлами <канал>.<язык>.json в TEMPLATES_DIR:
+в файле достаточно указать изменяемые ключи (subject, body,
+digest_subject, digest_body, item, item_message, time_format).
+
+Шаблоны проверяются и компилируются один раз при запуске, скомпилированные
+хранятся в ограниченном кэше. Сообщения Telegram отправляются с разметкой
+HTML: значения полей экранируются один раз при подстановке, а разметка
+самого шаблона (<b>, <i>) сохраняется. В отличие от Markdown, HTML
+позволяет экранировать и текст внутри выделения.
+"""
+
+import os
+import json
+import string
+import logging
+import threading
+from collections import OrderedDict
+
+# Каналы, сообщения которых строятся по шаблонам
+CHANNELS = ('email', 'telegram')
+
+TEMPLATE_KEYS = ('subject', 'body', 'digest_subject', 'digest_body', 'item', 'item_message')
+FIELDS = frozenset(('name', 'title', 'message', 'time', 'count', 'items', 'number'))
+
+BUILTIN_TEMPLATES = {
+    ('email', 'ru'): {
+        'subject': "Напоминание: {title}",
+        'body': """
+            Привет, {name}!
+
+            Это напоминание: {title}
+
+            {message}
+
+            Время напоминания: {time}
+            """,
+        'digest_subject': "Напоминания ({count})",
+        'digest_body': "Привет, {name}!\n\nВаши напоминания:\n\n{items}\n",
+        'item': "{number}. {title} ({time})",
+        'item_message': "   {message}",
+        'time_format': '%Y-%m-%d %H:%M',
+    },
+    ('email', 'en'): {
+        'subject': "Reminder: {title}",
+        'body': "Hello, {name}!\n\nThis is a reminder: {title}\n\n{message}\n\nReminder time: {time}\n",
+        'digest_subject': "Reminders ({count})",
+        'digest_body': "Hello, {name}!\n\nYour reminders:\n\n{items}\n",
+        'item': "{number}. {title} ({time})",
+        'item_message': "   {message}",
+        'time_format': '%Y-%m-%d %H:%M',
+    },
+    ('telegram', 'ru'): {
+        'body': """
+🔔 <b>Напоминание: {title}</b>
+
+{message}
+
+⏰ Время: {time}
+            """,
+        'digest_body': "🔔 <b>Напоминания ({count})</b>\n\n{items}",
+        'item': "• <b>{title}</b> ({time})",
+        'item_message': "{message}",
+        'time_format': '%d.%m.%Y %H:%M',
+    },
+    ('telegram', 'en'): {
+        'body': "\n🔔 <b>Reminder: {title}</b>\n\n{message}\n\n⏰ Time: {time}\n",
+        'digest_body': "🔔 <b>Reminders ({count})</b>\n\n{items}",
+        'item': "• <b>{title}</b> ({time})",
+        'item_message': "{message}",
+        'time_format': '%Y-%m-%d %H:%M',
+    },
+}
+
+_TELEGRAM_HTML = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+def escape_html(text):
+    """Экранирование текста для разметки HTML Telegram (& < >)"""
+    # Проверка вхождений быстрее translate, а служебные символы встречаются редко
+    if '&' in text or '<' in text or '>' in text:
+        return text.translate(_TELEGRAM_HTML)
+    return text
+
+def _compile(text, where):
+    """Проверка шаблона и его подготовка к подстановке
+
+    Возвращает функцию подстановки (метод str.format_map): разбор строки в C,
+    а ошибки шаблона обнаруживаются при запуске, а не при отправке.
+    """
+    try:
+        parts = list(string.Formatter().parse(text))
+    except ValueError as e:
+        raise ValueError(f"Шаблон {where}: {e}")
+    for _, field, _, _ in parts:
+        if field is None:
+            continue
+        name = field.split('.', 1)[0].split('[', 1)[0]
+        if name not in FIELDS:
+            raise ValueError(f"Шаблон {where}: неизвестное поле {{{field}}}")
+    if all(field is None for _, field, _, _ in parts):
+        # Шаблон без полей (или пустой) подстановки не требует
+        return lambda values: text
+    return text.format_map
+
+class MessageTemplate:
+    """Скомпилированные шаблоны одного канала для одного языка"""
+
+    def __init__(self, channel, locale, source):
+        self.channel = channel
+        self.locale = locale
+        self.time_format = source.get('time_format', '%Y-%m-%d %H:%M')
+        self._escape = escape_html if channel == 'telegram' else None
+        for key in TEMPLATE_KEYS:
+            setattr(self, key, _compile(source.get(key, ''), f"{channel}.{locale}.{key}"))
+
+    def _values(self, reminder):
+        escape = self._escape
+        title = reminder.title
+        message = reminder.message or ''
+        if escape:
+            title, message = escape(title), escape(message)
+        return {'title': title, 'message': message, 'time': reminder.reminder_time.strftime(self.time_format)}
+
+    def render(self, user, reminders):
+        """Тема и текст сообщения с одним напоминанием или дайджестом"""
+        name = self._escape(user.name) if self._escape else user.name
+        if len(reminders) == 1:
+            values = self._values(reminders[0])
+            values['name'] = name
+            return self.subject(values), self.body(values)
+
+        items = []
+        for number, reminder in enumerate(reminders, 1):
+            values = self._values(reminder)
+            values['number'] = number
+            items.append(self.item(values))
+            if reminder.message:
+                items.append(self.item_message(values))
+        values = {'name': name, 'count': len(reminders), 'items': "\n".join(items)}
+        return self.digest_subject(values), self.digest_body(values)
+
+class TemplateRegistry:
+    """Шаблоны всех каналов и языков с ограниченным кэшем скомпилированных
+
+    Кэш хранит не больше cache_size шаблонов, при переполнении вытесняются
+    добавленные раньше всех. Язык пользователя берется из user.locale ('en', 'en-US'), при отсутствии
+    шаблонов для него используется язык без региона, затем default_locale.
+    """
+
+    def __init__(self, directory=None, default_locale='ru', cache_size=64):
+        self.logger = logging.getLogger(__name__)
+        self.default_locale = default_locale
+        self.cache_size = max(1, cache_size)
+        self._sources = {key: dict(source) for key, source in BUILTIN_TEMPLATES.items()}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            self._load_directory(directory)
+        for channel in CHANNELS:
+            if (channel, default_locale) not in self._sources:
+                raise ValueError(f"Нет шаблонов {channel} для языка по умолчанию {default_locale}")
+
+    def _load_directory(self, directory):
+        """Переопределение шаблонов файлами <канал>.<язык>.json"""
+        for filename in sorted(os.listdir(directory)):
+            stem, extension = os.path.splitext(filename)
+            if extension != '.json' or '.' not in stem:
+                continue
+            channel, locale = stem.split('.', 1)
+            if channel not in CHANNELS:
+                self.logger.warning(f"Шаблон {filename} пропущен: неизвестный канал {channel}")
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                with open(path, encoding='utf-8') as file:
+                    overrides = json.load(file)
+            except ValueError as e:
+                raise ValueError(f"Шаблон {filename}: некорректный JSON ({e})")
+            unknown = set(overrides) - set(TEMPLATE_KEYS) - {'time_format'}
+            if unknown:
+                raise ValueError(f"Шаблон {filename}: неизвестные ключи {', '.join(sorted(unknown))}")
+            locale = locale.lower().replace('_', '-')
+            base = self._sources.get((channel, locale)) or BUILTIN_TEMPLATES[(channel, self.default_locale)]
+            self._sources[(channel, locale)] = {**base, **overrides}
+
+    def preload(self):
+        """Компиляция всех известных шаблонов (ошибки шаблонов - при запуске)"""
+        for channel, locale in list(self._sources)[:self.cache_size]:
+            self.get(channel, locale)
+        return self
+
+    def _resolve(self, channel, locale):
+        """Ключ шаблонов для языка с учетом запасных вариантов"""
+        if locale:
+            locale = locale.lower().replace('_', '-')
+            for candidate in (locale, locale.split('-', 1)[0]):
+                if (channel, candidate) in self._sources:
+                    return channel, candidate
+        return channel, self.default_locale
+
+    def get(self, channel, locale=None):
+        """Скомпилированные шаблоны канала для языка"""
+        key = (channel, locale)
+        # Чтение без блокировки: кэш меняется только при промахе
+        template = self._cache.get(key)
+        if template is not None:
+            return template
+
+        source_key = self._resolve(channel, locale)
+        template = MessageTemplate(*source_key, self._sources[source_key])
+        with self._lock:
+            self._cache[key] = template
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return template
+
+    def render(self, channel, user, reminders):
+        """Тема и текст сообщения канала на языке пользователя"""
+        return self.get(channel, getattr(user, 'locale', None)).render(user, reminders)
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+from channels import Channel, SendDeferred
+from metrics import REMINDERS_RETRIED
+
+class WebhookChannel(Channel):
+    """Отправка напоминаний POST запросом с JSON на HTTP endpoint
+
+    Адрес берется из webhook_url пользователя, иначе используется
+    default_url. Все запросы идут через один httpx.AsyncClient с пулом
+    keep-alive соединений; число одновременных запросов к одному адресу
+    ограничено endpoint_concurrency. Тело запроса: {"reminders": [...]}.
+
+    При batch_size > 1 в режиме async напоминания разных пользователей для
+    одного адреса копятся до batch_size штук или batch_wait секунд и
+    отправляются одним запросом; результат запроса получают все его
+    напоминания. Ответ 429 повторяется после Retry-After, а если ждать
+    нужно дольше max_wait секунд, бросается SendDeferred.
+    """
+
+    def __init__(self, run_coroutine, default_url=None, timeout=10, max_connections=100,
+                 endpoint_concurrency=10, batch_size=1, batch_wait=0.05, token=None, max_retries=3,
+                 max_wait=None):
+        self.logger = logging.getLogger(__name__)
+        self.run_coroutine = run_coroutine
+        self.default_url = default_url
+        self.timeout = timeout
+        self.max_connections = max(1, max_connections)
+        self.endpoint_concurrency = max(1, endpoint_concurrency)
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.headers = {'Authorization': f"Bearer {token}"} if token else {}
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        self._client = None
+        self._endpoint_slots = {}
+        self._pending = {}
+        self._flush_timers = {}
+        self._flush_tasks = set()
+
+    def _get_client(self):
+        """HTTP клиент с пулом keep-alive соединений (создается в цикле событий сервиса)"""
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                headers=self.headers,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    def _endpoint_url(self, user):
+        return getattr(user, 'webhook_url', None) or self.default_url
+
+    def _payload(self, user, reminder):
+        return {
+            'id': reminder.id,
+            'user_id': user.id,
+            'user_name': user.name,
+            'title': reminder.title,
+            'message': reminder.message,
+            'reminder_time': reminder.reminder_time.isoformat(),
+        }
+
+    def send(self, user, reminders):
+        url = self._endpoint_url(user)
+        if not url:
+            self.logger.warning("Webhook не настроен для отправки")
+            return False
+        return self.run_coroutine(self._post(url, [self._payload(user, reminder) for reminder in reminders]))
+
+    async def send_async(self, user, reminders):
+        url = self._endpoint_url(user)
+        if not url:
+            self.logger.warning("Webhook не настроен для отправки")
+            return False
+        payloads = [self._payload(user, reminder) for reminder in reminders]
+        if self.batch_size == 1:
+            return await self._post(url, payloads)
+        return await self._enqueue(url, payloads)
+
+    async def _enqueue(self, url, payloads):
+        """Постановка напоминаний в пачку адреса и ожидание результата ее отправки"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(url, [])
+        batch.append((payloads, future))
+        if sum(len(items) for items, _ in batch) >= self.batch_size:
+            self._flush(url)
+        elif len(batch) == 1:
+            self._flush_timers[url] = loop.call_later(self.batch_wait, self._flush, url)
+        return await future
+
+    def _flush(self, url):
+        """Отправка накопленной пачки адреса"""
+        timer = self._flush_timers.pop(url, None)
+        if timer is not None:
+            # Пачка отправлена по размеру раньше таймера, он сработал бы уже для следующей
+            timer.cancel()
+        batch = self._pending.pop(url, None)
+        if batch:
+            # Ссылка на задачу нужна, иначе цикл событий хранит ее только слабо
+            task = asyncio.ensure_future(self._post_batch(url, batch))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    async def _post_batch(self, url, batch):
+        try:
+            success = await self._post(url, [payload for payloads, _ in batch for payload in payloads])
+        except SendDeferred as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except Exception as e:
+            self.logger.error(f"Ошибка отправки пачки webhook на {url}: {e}")
+            success = False
+        for _, future in batch:
+            if not future.done():
+                future.set_result(success)
+
+    def _endpoint_slot(self, url):
+        """Семафор, ограничивающий число одновременных запросов к адресу"""
+        if url not in self._endpoint_slots:
+            self._endpoint_slots[url] = asyncio.Semaphore(self.endpoint_concurrency)
+        return self._endpoint_slots[url]
+
+    async def _post(self, url, payloads):
+        """POST запрос с напоминаниями, повтор при ответе 429"""
+        import httpx
+
+        async with self._endpoint_slot(url):
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await self._get_client().post(url, json={'reminders': payloads})
+                except httpx.HTTPError as e:
+                    self.logger.error(f"Ошибка отправки webhook на {url}: {e!r}")
+                    return False
+
+                if response.status_code == 429 and attempt < self.max_retries:
+                    retry_after = self._retry_after(response)
+                    if self.max_wait is not None and retry_after > self.max_wait:
+                        raise SendDeferred(retry_after)
+                    self.logger.warning(f"Webhook {url} ограничил отправку, повтор через {retry_after} с")
+                    REMINDERS_RETRIED.inc(method='webhook')
+                    await asyncio.sleep(retry_after)
+                    continue
+
+                if response.is_success:
+                    return True
+                self.logger.error(f"Webhook {url} ответил {response.status_code}")
+                return False
+
+    def _retry_after(self, response):
+        try:
+            return max(0.0, float(response.headers.get('Retry-After', 1)))
+        except ValueError:
+            return 1.0
+
+    def close(self):
+        """Закрытие пула HTTP соединений"""
+        if self._client is not None:
+            self.run_coroutine(self._client.aclose())
+            self._client = None